@@ -0,0 +1,189 @@
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+
+ARCHIVE_CACHE_DIR = "archive_cache"
+
+
+class PoliteRateLimiter:
+    """Spaces request starts at least 1/requests_per_sec apart, across all threads."""
+
+    def __init__(self, requests_per_sec=1.0):
+        self.interval = 1.0 / requests_per_sec if requests_per_sec else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def month_end(archive_url):
+    """End (UTC) of the month of an archive URL ending in /YYYY/MM, or None for any other URL."""
+    match = re.search(r"/(\d{4})/(\d{2})/?$", archive_url)
+    if not match:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    return datetime.datetime(year + month // 12, month % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def is_final(archive_url, meta):
+    """
+    True if the cached copy described by meta was fetched after its month
+    ended, so it can no longer change. A copy fetched while the month was
+    still running is not, even once the month is over.
+    """
+    end = month_end(archive_url)
+    fetched_at = meta.get("fetched_at")
+    return end is not None and fetched_at is not None and datetime.datetime.fromisoformat(fetched_at) >= end
+
+
+def retry_after(value, default):
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date), else default."""
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class ArchiveDownloader:
+    """
+    Downloads chess.com monthly archive PGNs with a shared session and an on-disk cache.
+
+    Requests go through one requests.Session (connection pooling), at most
+    `max_workers` at a time and no faster than `requests_per_sec`. Every PGN
+    is cached under `cache_dir` with its ETag/Last-Modified and fetch time; archives
+    fetched after their month was over are served from the cache without any
+    request, and anything else (the current month, or a month cached while it
+    was still running) is revalidated with a conditional request.
+    """
+
+    def __init__(self, cache_dir=ARCHIVE_CACHE_DIR, max_workers=4, requests_per_sec=1.0, headers=None,
+                 max_retries=3, session=None):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.limiter = PoliteRateLimiter(requests_per_sec)
+        self.session = session or requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        self.requests_made = 0
+        self.not_modified = 0
+        self.cache_hits = 0
+        self._stats_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name + ".pgn"), os.path.join(self.cache_dir, name + ".json")
+
+    def _load(self, url):
+        pgn_path, meta_path = self._paths(url)
+        if not (os.path.exists(pgn_path) and os.path.exists(meta_path)):
+            return None, {}
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(pgn_path, "r", encoding="utf-8") as f:
+            return f.read(), meta
+
+    def _store(self, url, text, resp, old_meta=None):
+        """Cache text (None: keep the cached PGN, e.g. after a 304) with resp's validators and the fetch time."""
+        pgn_path, meta_path = self._paths(url)
+        old_meta = old_meta or {}
+        meta = {"url": url, "etag": resp.headers.get("ETag") or old_meta.get("etag"),
+                "last_modified": resp.headers.get("Last-Modified") or old_meta.get("last_modified"),
+                "fetched_at": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+        writes = [(meta_path, lambda f: json.dump(meta, f))]
+        if text is not None:
+            writes.insert(0, (pgn_path, lambda f: f.write(text)))
+        # Write to temp files and rename so an interrupted run never leaves a half-written cache entry
+        for path, write in writes:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                write(f)
+            os.replace(path + ".tmp", path)
+
+    def _get(self, url, headers=None):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            with self._stats_lock:
+                self.requests_made += 1
+            resp = self.session.get(url, headers=headers, timeout=60)
+            if resp.status_code == 429 and attempt < self.max_retries:
+                time.sleep(retry_after(resp.headers.get("Retry-After"), 2 ** attempt))
+                continue
+            return resp
+
+    def get_archives(self, base_url):
+        """List of monthly archive URLs for a player's archives endpoint."""
+        resp = self._get(base_url)
+        resp.raise_for_status()
+        return resp.json().get("archives", [])
+
+    def download(self, archive_url):
+        """PGN text of one monthly archive, from the cache when it is known to be current."""
+        url = archive_url + "/pgn"
+        text, meta = self._load(url)
+        if text is not None and is_final(archive_url, meta):
+            with self._stats_lock:
+                self.cache_hits += 1
+            return text
+
+        headers = {}
+        if text is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        resp = self._get(url, headers)
+        if resp.status_code == 304 and text is not None:
+            with self._stats_lock:
+                self.not_modified += 1
+            # Record the new fetch time: once it is past the month's end the copy is final
+            self._store(url, None, resp, meta)
+            return text
+        resp.raise_for_status()
+        self._store(url, resp.text, resp)
+        return resp.text
+
+    def download_all(self, archive_urls):
+        """
+        Yield (archive_url, pgn_text) in the order of archive_urls, downloading
+        concurrently. At most max_workers archives are in flight or waiting to
+        be consumed, so memory does not grow with the number of months.
+        """
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for url in archive_urls:
+                if len(pending) >= self.max_workers:
+                    done_url, future = pending.popleft()
+                    yield done_url, future.result()
+                pending.append((url, executor.submit(self.download, url)))
+            while pending:
+                done_url, future = pending.popleft()
+                yield done_url, future.result()
+
+    def stats(self):
+        return (f"archives: {self.requests_made} requests, {self.not_modified} not modified, "
+                f"{self.cache_hits} served from cache without a request")
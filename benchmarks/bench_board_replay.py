@@ -0,0 +1,49 @@
+"""
+Board reconstruction for every prompt of the data/ store: full replay versus the shared PositionTrie.
+
+Every position's history is rebuilt three times, once per data format, as
+run_eval.py does.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_board_replay
+"""
+import argparse
+import time
+
+from benchmarks.common import store_histories
+from position_trie import PositionTrie
+from run_eval import moves_to_position
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    histories = store_histories() * 3
+    full_pushes = sum(len(h.split()) for h in histories)
+
+    full_time = trie_time = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        full_boards = [moves_to_position(h) for h in histories]
+        full_time = min(full_time, time.perf_counter() - start)
+
+        trie = PositionTrie()
+        start = time.perf_counter()
+        trie_boards = [trie.board(h) for h in histories]
+        trie_time = min(trie_time, time.perf_counter() - start)
+
+    # Same position, and the same repetitions visible on the move stack
+    mismatches = sum(a.fen() != b.fen() or a.is_repetition(2) != b.is_repetition(2)
+                     or a.can_claim_threefold_repetition() != b.can_claim_threefold_repetition()
+                     for a, b in zip(full_boards, trie_boards) if a is not None)
+    print(f"records:          {len(histories)}")
+    print(f"full replay:      {full_time:.3f}s, {full_pushes} push_san calls")
+    print(f"position trie:    {trie_time:.3f}s, {trie.pushes} push_san calls")
+    print(f"speedup:          {full_time / trie_time:.1f}x")
+    print(f"mismatched boards: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Throughput of move_normalized_score with an engine pool of 1 versus N.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_engine_pool --positions 40 --sizes 1 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import evaluation
+from benchmarks.common import load_boards
+
+
+def run(boards, pool_size, time_limit):
+    """Score the first legal move of every board with `pool_size` engines; return positions/sec."""
+    evaluation.close_engine_pool()
+    evaluation.get_engine_pool(pool_size)
+    jobs = [(board, board.san(next(iter(board.legal_moves)))) for board in boards]
+
+    def score(job):
+        # Bypass the eval cache so every job really reaches an engine
+        return evaluation.move_normalized_score(job[0], job[1], time_limit, use_cache=False)
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            list(executor.map(score, jobs))
+        elapsed = time.perf_counter() - start
+    finally:
+        evaluation.close_engine_pool()
+    return len(jobs) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--positions", type=int, default=40)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--time-limit", type=float, default=0.05)
+    args = parser.parse_args()
+
+    boards = load_boards(args.positions)
+    for size in args.sizes:
+        rate = run(boards, size, args.time_limit)
+        print(f"pool size {size:3d}: {rate:8.2f} positions/sec")
+
+
+if __name__ == "__main__":
+    main()
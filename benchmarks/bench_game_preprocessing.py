@@ -0,0 +1,83 @@
+"""
+Per-game preprocessing: the formatted_games.txt round-trip versus feeding mainline moves directly.
+
+The old path turns each chess.pgn.Game into SAN text, writes and re-reads
+formatted_games.txt, then replays every move with push_san. The direct path
+walks the mainline chess.Move objects and pushes them, computing each SAN
+once for the move history. Engine analysis is left out of both.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_game_preprocessing --games 50
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import chess
+import chess.pgn
+
+import generate_data
+from fake_archive_server import synthetic_month_pgn
+
+
+def sample_games(n):
+    pgn = io.StringIO(synthetic_month_pgn(generate_data.USERNAME, 2024, 1, n))
+    return [chess.pgn.read_game(pgn) for _ in range(n)]
+
+
+def text_round_trip(games, path):
+    """Old path: export to text, parse the file, push_san every move."""
+    generate_data.export_games_as_custom(games, path)
+    boards = 0
+    for moves in generate_data.parse_games_from_file(path):
+        board = chess.Board()
+        history = []
+        for move in moves:
+            history.append(move)
+            board.push_san(move)
+            boards += 1
+    return boards
+
+
+def direct(games):
+    """New path: mainline chess.Move objects pushed straight onto the board."""
+    boards = 0
+    for moves in generate_data.game_moves(games):
+        board = chess.Board()
+        history = []
+        for move in moves:
+            history.append(board.san(move))
+            board.push(move)
+            boards += 1
+    return boards
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    games = sample_games(args.games)
+    path = os.path.join(tempfile.mkdtemp(), "formatted_games.txt")
+    old_time = new_time = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        old_boards = text_round_trip(games, path)
+        old_time = min(old_time, time.perf_counter() - start)
+        start = time.perf_counter()
+        new_boards = direct(games)
+        new_time = min(new_time, time.perf_counter() - start)
+    os.remove(path)
+
+    assert old_boards == new_boards
+    print(f"games: {len(games)}, positions: {new_boards}")
+    print(f"text round-trip: {old_time / len(games) * 1000:.2f} ms/game")
+    print(f"direct moves:    {new_time / len(games) * 1000:.2f} ms/game")
+    print(f"reduction:       {1 - new_time / old_time:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Move extraction from model replies: SAN-looking tokens checked against legal_sans versus one LegalMoveIndex per position.
+
+The old path regex-extracts every SAN-looking token of a reply, then builds
+{board.san(m): m} for the position twice (has_legal_move and
+move_normalized_scores) to find out which of them are legal. The new path
+builds the position's LegalMoveIndex once, shared by its three formats, and
+matches the reply against it in a single scan. Engine scoring is left out of
+both.
+
+Replies are the ones recorded in a results log (default eval_results.jsonl);
+without one, stub replies are recorded for the store's positions, padded with
+the kind of move-numbered recap ("After 23. Qd2 Rfe8 24. Bh6 ...") that real
+models write around their answer.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_move_extraction --results eval_results.jsonl --repeat 3
+"""
+import argparse
+import os
+import random
+import time
+
+import evaluation
+import run_eval
+from benchmarks.common import DATA_DIR
+from dataset_store import DatasetStore
+from model_backends import StubBackend
+from position_trie import PositionTrie
+from results_log import read_results
+
+
+def recorded_replies(store, results_path):
+    """(move history, reply) pairs from a results log, or recorded from the stub if there is none."""
+    histories = {(d, rec["pos_id"]): store.history(rec) for d in ("easy", "normal", "hard") for rec in store.positions(d)}
+    if results_path and os.path.exists(results_path):
+        return [(histories[r["difficulty"], r["pos_id"]], r["response"]) for r in read_results(results_path)
+                if (r["difficulty"], r["pos_id"]) in histories]
+
+    trie = PositionTrie()
+    stub = StubBackend(legal_rate=0.8, board_for_prompt=lambda prompt: trie.board(prompt.split("|")[1]))
+    replies = []
+    for _, moves_str in sorted(histories.items()):
+        moves = moves_str.split()
+        rng = random.Random(moves_str)
+        first = max(0, len(moves) - rng.randint(2, 6))
+        recap = " ".join(f"{i // 2 + 1}. {m}" if i % 2 == 0 else m for i, m in enumerate(moves[first:], start=first))
+        for data_format in ("verbel", "board", "history"):
+            answer = stub.reply(f"{data_format}|{moves_str}")
+            replies.append((moves_str, f"After {recap}, the position is balanced. {answer}" if recap else answer))
+    return replies
+
+
+def has_legal_move(board, move_strs):
+    """The old pre-check of run_eval: True if any of move_strs is a legal SAN move in the position."""
+    sans = evaluation.legal_sans(board)
+    return any(move_str in sans for move_str in move_strs)
+
+
+def legacy(replies, trie):
+    found = 0
+    for moves_str, reply in replies:
+        board = trie.board(moves_str)
+        moves = run_eval.extract_all_chess_moves(reply)
+        if has_legal_move(board, moves):
+            sans = evaluation.legal_sans(board)
+            found += sum(1 for move in moves if move in sans)
+    return found
+
+
+def indexed(replies, trie):
+    found = 0
+    for moves_str, reply in replies:
+        found += len(trie.move_index(moves_str).find(reply))
+    return found
+
+
+def compare(replies):
+    """Tokens extracted by the old path, how many were legal, and what the index finds instead."""
+    trie = PositionTrie()
+    tokens = legal = new = gained = lost = 0
+    for moves_str, reply in replies:
+        board = trie.board(moves_str)
+        old = set(run_eval.extract_all_chess_moves(reply)) & set(evaluation.legal_sans(board))
+        moves = set(trie.move_index(moves_str).find(reply))
+        tokens += len(run_eval.extract_all_chess_moves(reply))
+        legal += len(old)
+        new += len(moves)
+        gained += bool(moves) and not old
+        lost += bool(old) and not moves
+    return tokens, legal, new, gained, lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--results", default="eval_results.jsonl", help="results log with recorded replies")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    replies = recorded_replies(DatasetStore(DATA_DIR), args.results)
+    print(f"{len(replies)} replies of {len({m for m, _ in replies})} positions")
+
+    for name, run in (("regex + legal_sans", legacy), ("LegalMoveIndex", indexed)):
+        best = None
+        for _ in range(args.repeat):
+            trie = PositionTrie()
+            for moves_str, _ in replies:
+                trie.board(moves_str)  # board replay is the same for both paths and not timed
+            start = time.perf_counter()
+            run(replies, trie)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"  {name:20s} {best:7.3f}s  {best / len(replies) * 1e6:8.1f} us/reply")
+
+    tokens, legal, new, gained, lost = compare(replies)
+    print(f"old path: {tokens} SAN-looking tokens, {legal} of them legal; index: {new} legal moves")
+    print(f"replies with a legal move only the index finds: {gained}, only the old path finds: {lost}")
+
+
+if __name__ == "__main__":
+    main()
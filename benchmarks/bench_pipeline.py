@@ -0,0 +1,107 @@
+"""
+Throughput of the run_eval.py pipeline with the in-process stub model.
+
+Times each stage (prompt building, board replay, legal-move index, model call, move
+extraction, scoring) for every data format of one difficulty, so the
+pipeline's own overhead can be told apart from model latency.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_pipeline --difficulty easy --limit 100 --mean-latency 0
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+import evaluation
+import run_eval
+from benchmarks.common import DATA_DIR
+from dataset_store import DatasetStore
+from llm_client import generate_all
+from model_backends import StubBackend
+from position_trie import PositionTrie
+
+FORMATS = [(1, "verbal"), (2, "turn_board"), (3, "history")]
+
+
+def run_format(positions, data_format, backend, position_trie, args, timings):
+    start = time.perf_counter()
+    prompts = [run_eval.build_prompt(pos, data_format) for pos in positions]
+    timings["build_prompt"] += time.perf_counter() - start
+
+    responses = None
+    if args.use_async:
+        start = time.perf_counter()
+        responses = asyncio.run(generate_all(backend.agenerate, [p for p, _ in prompts], args.max_in_flight,
+                                             requests_per_min=None))
+        timings["model"] += time.perf_counter() - start
+
+    total = 0.0
+    for i, (prompt, moves_str) in enumerate(prompts):
+        start = time.perf_counter()
+        board = position_trie.board(moves_str)
+        timings["moves_to_position"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        move_index = position_trie.move_index(moves_str)
+        timings["move_index"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = responses[i] if responses is not None else backend.generate(prompt)
+        timings["model"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        moves = move_index.find(response)
+        timings["extract_moves"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        total += evaluation.max_move_normalized_score(board, moves, use_cache=not args.no_cache, index=move_index)
+        timings["score"] += time.perf_counter() - start
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--difficulty", default="easy", choices=["easy", "normal", "hard"])
+    parser.add_argument("--limit", type=int, default=100, help="positions per format")
+    parser.add_argument("--legal-rate", type=float, default=0.8)
+    parser.add_argument("--latency", default="fixed", choices=StubBackend.LATENCY_DISTRIBUTIONS)
+    parser.add_argument("--mean-latency", type=float, default=0.0)
+    parser.add_argument("--async", dest="use_async", action="store_true")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--no-cache", action="store_true", help="bypass the evaluation cache")
+    args = parser.parse_args()
+
+    prompt_moves = {}
+    position_trie = PositionTrie()
+
+    def board_for_prompt(prompt):
+        return position_trie.board(prompt_moves[prompt])
+
+    backend = StubBackend(args.legal_rate, args.latency, args.mean_latency, board_for_prompt=board_for_prompt)
+    timings = defaultdict(float)
+    n = 0
+    wall = time.perf_counter()
+    store = DatasetStore(DATA_DIR)
+    records = store.positions(args.difficulty)[:args.limit]
+    try:
+        for data_format, name in FORMATS:
+            positions = [store.render(rec, data_format) for rec in records]
+            prompt_moves.update(run_eval.build_prompt(pos, data_format) for pos in positions)
+            total = run_format(positions, data_format, backend, position_trie, args, timings)
+            n += len(positions)
+            print(f"{name:10s} avg score {total / max(len(positions), 1):.3f}")
+    finally:
+        store.close()
+        evaluation.close_engine_pool()
+    wall = time.perf_counter() - wall
+
+    print(f"\n{n} positions in {wall:.2f}s: {n / wall:.1f} positions/sec")
+    overhead = wall - timings["model"]
+    print(f"pipeline overhead (everything but the model): {overhead:.2f}s, {overhead / n * 1000:.2f} ms/position")
+    for stage, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        print(f"  {stage:18s} {seconds:8.3f}s  {seconds / wall:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
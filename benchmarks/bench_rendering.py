@@ -0,0 +1,134 @@
+"""
+Position rendering: piece_at / str(board) versus one pass over the piece bitboards.
+
+Replays every game of the dataset store and, for each ply, checks that the
+bitboard renderer produces exactly the old 8x8 array, verbal description and
+board.fen(), then times the old functions, render_position on each board,
+and render_game on whole games.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_rendering --repeat 3
+"""
+import argparse
+import json
+import os
+import time
+
+import chess
+
+from benchmarks.common import DATA_DIR
+from rendering import render_game, render_position, turn_string
+
+
+def reference_board_to_array(board):
+    """board_to_array before the bitboard renderer."""
+    board_str = str(board)
+    rows = board_str.split("\n")
+    arr = []
+    for row in rows:
+        arr.append([c if c != "." else "." for c in row.split(" ")])
+    return arr
+
+
+def reference_describe_position(board, turn):
+    """describe_position before the bitboard renderer."""
+    piece_names = {
+        'P': 'pawn', 'N': 'knight', 'B': 'bishop',
+        'R': 'rook', 'Q': 'queen', 'K': 'king',
+        'p': 'pawn', 'n': 'knight', 'b': 'bishop',
+        'r': 'rook', 'q': 'queen', 'k': 'king'
+    }
+    white_pieces = {}
+    black_pieces = {}
+    for square in chess.SQUARES:
+        piece = board.piece_at(square)
+        if piece is None:
+            continue
+        name = piece_names[piece.symbol()]
+        if piece.color == chess.WHITE:
+            white_pieces.setdefault(name, []).append(chess.square_name(square))
+        else:
+            black_pieces.setdefault(name, []).append(chess.square_name(square))
+
+    def format_desc(color_pieces, color_name):
+        if not color_pieces:
+            return f"{color_name} has no pieces"
+        parts = []
+        for piece_type, squares in color_pieces.items():
+            parts.append(f"{piece_type}s on {', '.join(squares)}")
+        return f"{color_name} has " + "; ".join(parts)
+
+    return format_desc(white_pieces, "White") + ". " + format_desc(black_pieces, "Black") + ". " + turn + "."
+
+
+def load_games():
+    with open(os.path.join(DATA_DIR, "games.jsonl"), "r", encoding="utf-8") as f:
+        return [json.loads(line)["moves"].split() for line in f]
+
+
+def game_boards(games):
+    boards = []
+    for moves in games:
+        board = chess.Board()
+        for move in moves:
+            board.push_san(move)
+            boards.append(board.copy(stack=False))
+    return boards
+
+
+def check(games, boards):
+    """Number of plies where any representation differs from the old functions."""
+    bulk = [r for moves in games for r in render_game(moves)]
+    mismatches = 0
+    for board, rendered in zip(boards, bulk):
+        turn = turn_string(board)
+        expected = (reference_board_to_array(board), reference_describe_position(board, turn), board.fen())
+        mismatches += tuple(rendered) != expected or tuple(render_position(board, turn)) != expected
+    return mismatches
+
+
+def best_of(repeat, func):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    games = load_games()
+    boards = game_boards(games)
+    turns = [turn_string(board) for board in boards]
+    print(f"{len(games)} games, {len(boards)} positions, {check(games, boards)} mismatches")
+
+    def old():
+        for board, turn in zip(boards, turns):
+            reference_board_to_array(board)
+            reference_describe_position(board, turn)
+            board.fen()
+
+    def new():
+        for board, turn in zip(boards, turns):
+            render_position(board, turn)
+
+    def bulk():
+        for moves in games:
+            render_game(moves)
+
+    old_time = best_of(args.repeat, old)
+    new_time = best_of(args.repeat, new)
+    bulk_time = best_of(args.repeat, bulk)
+    per = 1e6 / len(boards)
+    print(f"array + verbal + fen, old:   {old_time:.3f}s  {old_time * per:6.1f} us/position")
+    print(f"render_position:             {new_time:.3f}s  {new_time * per:6.1f} us/position  "
+          f"({old_time / new_time:.1f}x)")
+    print(f"render_game (incl. replay):  {bulk_time:.3f}s  {bulk_time * per:6.1f} us/position")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+from dataset_store import DatasetStore, replay
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+# The order the per-format files used to be read in (sorted file names), so position sets stay the same
+DIFFICULTY_ORDER = ("easy", "hard", "normal")
+
+
+def store_histories(data_dir=DATA_DIR):
+    """Move history of every position of the dataset store in data_dir, by difficulty, then pos_id."""
+    store = DatasetStore(data_dir)
+    try:
+        return [store.history(rec) for difficulty in DIFFICULTY_ORDER for rec in store.positions(difficulty)]
+    finally:
+        store.close()
+
+
+def load_boards(limit=None):
+    """
+    Load the unique positions of the dataset store in data/ as chess.Board objects.
+
+    Positions are read in a fixed order and deduplicated by FEN, so the same
+    call always returns the same boards in the same order.
+    """
+    boards = []
+    seen = set()
+    for moves in store_histories():
+        board = replay(moves.split())
+        if board is None:
+            continue
+        fen = board.fen()
+        if fen in seen or board.is_game_over():
+            continue
+        seen.add(fen)
+        boards.append(board)
+        if limit and len(boards) >= limit:
+            return boards
+    return boards
+
+
+def fixed_positions(n):
+    """
+    n (move history, board) pairs spread evenly over the unique positions of
+    the dataset store in data/, so openings, middlegames and endgames are all
+    in the set, plus a fingerprint of the set for comparing benchmark runs.
+    """
+    histories = list(dict.fromkeys(store_histories()))
+    step = max(1, len(histories) // n) if n else 1
+    picked = histories[::step][:n]
+    positions = []
+    for moves in picked:
+        positions.append((moves, replay(moves.split())))
+    fingerprint = hashlib.sha1("\n".join(picked).encode("utf-8")).hexdigest()[:12]
+    return positions, fingerprint
@@ -0,0 +1,79 @@
+"""
+Compare single-search (MultiPV) scoring against the per-child scoring on the data/ positions.
+
+Reports the wall-time speedup and how closely the two methods agree on the
+ranking of the legal moves (Spearman correlation and best-move agreement).
+
+Usage (from the repository root):
+    python -m benchmarks.compare_scoring --positions 50 --time-limit 0.05
+"""
+import argparse
+import time
+
+import numpy as np
+
+import evaluation
+from benchmarks.common import load_boards
+
+
+def rank(values):
+    """Average ranks of `values` (ties share the mean of their positions)."""
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(len(values), dtype=float)
+    ranks[order] = np.arange(len(values), dtype=float)
+    for value in np.unique(values):
+        tied = values == value
+        ranks[tied] = ranks[tied].mean()
+    return ranks
+
+
+def spearman(a, b):
+    ra, rb = rank(a), rank(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return 1.0 if ra.std() == rb.std() else 0.0
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def timed_scores(board, time_limit, method):
+    start = time.perf_counter()
+    _, scores = evaluation.legal_move_scores(board, time_limit, method, use_cache=False)
+    return scores, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--positions", type=int, default=50)
+    parser.add_argument("--time-limit", type=float, default=0.05,
+                        help="per-child search time; also the time of the single MultiPV search")
+    parser.add_argument("--multipv-time-limit", type=float, default=None,
+                        help="override the time limit of the single MultiPV search")
+    args = parser.parse_args()
+    multipv_limit = args.multipv_time_limit or args.time_limit
+
+    boards = load_boards(args.positions)
+    per_child_time = multipv_time = 0.0
+    correlations = []
+    same_best = 0
+    try:
+        for board in boards:
+            child_scores, t_child = timed_scores(board, args.time_limit, "per_child")
+            multipv_scores, t_multipv = timed_scores(board, multipv_limit, "multipv")
+            per_child_time += t_child
+            multipv_time += t_multipv
+            correlations.append(spearman(child_scores, multipv_scores))
+            same_best += int(np.argmax(child_scores) == np.argmax(multipv_scores))
+    finally:
+        evaluation.close_engine_pool()
+
+    n = len(boards)
+    print(f"positions:              {n}")
+    print(f"per-child time:         {per_child_time:.2f}s ({per_child_time / n:.3f}s/position)")
+    print(f"multipv time:           {multipv_time:.2f}s ({multipv_time / n:.3f}s/position)")
+    print(f"speedup:                {per_child_time / multipv_time:.1f}x")
+    print(f"mean Spearman rank rho: {np.mean(correlations):.3f}")
+    print(f"best move agreement:    {same_best / n:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Reproducible benchmark suite for the scoring and generation hot paths, saved as JSON and compared against a baseline.
+
+Micro-benchmarks time single calls of moves_to_position, describe_position,
+move_normalized_score (engine search, evaluation cache off) and play_game
+(fresh evaluation cache, so every ply is searched) on a fixed set of
+positions and games from data/. The end-to-end benchmark generates about N
+positions with generate_data.py (play_game, answer keys, the dataset store)
+and evaluates them with run_eval.py against the in-process stub model.
+
+The engine is --engine, else $CHESS_ENGINE, else Stockfish if it is on the
+PATH, else the bundled fake_uci_engine.py, so the suite runs on any CPU box; the engine is
+recorded with the results, and comparisons across engines are flagged. Runs
+happen in a scratch directory, so the caches and results of the working
+tree are never touched.
+
+Usage (from the repository root):
+    python -m benchmarks.suite --output bench_baseline.json
+    python -m benchmarks.suite --output bench_results.json --baseline bench_baseline.json --tolerance 0.1
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+
+import evaluation
+import generate_data
+import run_eval
+from benchmarks.common import DATA_DIR, fixed_positions
+from engine_locator import engine_label, locate_engine
+from eval_cache import close_eval_cache
+from rendering import describe_position, turn_string
+
+def use_engine(engine):
+    evaluation.close_engine_pool()
+    evaluation.ENGINE_PATH = engine
+    generate_data.ENGINE_PATH = engine
+    if generate_data.engine is not None:
+        generate_data.engine.quit()
+        generate_data.engine = None
+    evaluation.get_engine_pool(1)
+
+
+def fresh_eval_cache():
+    """Drop the evaluation cache of the scratch directory so the next search is not a cache hit."""
+    close_eval_cache()
+    for path in glob.glob("eval_cache.sqlite*"):
+        os.remove(path)
+
+
+def fixed_games(n, plies):
+    """The first plies SAN moves of the first n games of the dataset store."""
+    games = []
+    with open(os.path.join(DATA_DIR, "games.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            games.append(json.loads(line)["moves"].split()[:plies])
+            if len(games) == n:
+                break
+    return games
+
+
+def timings(samples):
+    samples = np.asarray(samples)
+    return {"calls": len(samples), "median": float(np.median(samples)), "mean": float(samples.mean()),
+            "min": float(samples.min()), "p95": float(np.quantile(samples, 0.95)), "total": float(samples.sum())}
+
+
+def time_calls(func, items, repeat):
+    samples = []
+    for _ in range(repeat):
+        for item in items:
+            start = time.perf_counter()
+            func(item)
+            samples.append(time.perf_counter() - start)
+    return timings(samples)
+
+
+def bench_moves_to_position(positions, args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return time_calls(run_eval.moves_to_position, [moves for moves, _ in positions], args.repeat)
+
+
+def bench_describe_position(positions, args):
+    boards = [(board, turn_string(board)) for _, board in positions]
+    return time_calls(lambda item: describe_position(*item), boards, args.repeat)
+
+
+def bench_move_normalized_score(positions, args):
+    # The first legal move in SAN order, so every run scores the same move of each position
+    jobs = [(board, min(evaluation.legal_sans(board))) for _, board in positions if not board.is_game_over()]
+    evaluation.move_normalized_score(*jobs[0], use_cache=False)  # start the engine outside the timing
+    return time_calls(lambda job: evaluation.move_normalized_score(*job, use_cache=False), jobs, args.repeat)
+
+
+def bench_play_game(positions, args):
+    games = fixed_games(args.games, args.plies)
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_data.get_engine()
+        for _ in range(args.repeat):
+            fresh_eval_cache()
+            for moves in games:
+                start = time.perf_counter()
+                generate_data.play_game(moves)
+                samples.append(time.perf_counter() - start)
+    result = timings(samples)
+    result["plies_per_game"] = args.plies
+    return result
+
+
+def bench_end_to_end(positions, args):
+    """Generate about args.end_to_end positions with play_game and evaluate them with the stub model."""
+    fresh_eval_cache()
+    generated = [[], [], []]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with open(os.path.join(DATA_DIR, "games.jsonl"), "r", encoding="utf-8") as f:
+            for game_id, line in enumerate(f):
+                game = generate_data.play_game(json.loads(line)["moves"].split(), game_id=game_id)
+                for bucket, found in zip(generated, game):
+                    bucket.extend(found)
+                if sum(map(len, generated)) >= args.end_to_end:
+                    break
+        generate_data.save_positions_to_jsonl(*generated, output_dir="data")
+    generate_seconds = time.perf_counter() - start
+
+    run_eval.BACKEND = "stub"
+    run_eval.STUB_OPTIONS = {"legal_rate": 0.8, "latency": "fixed", "mean_latency": args.llm_latency, "seed": 0}
+    run_eval.USE_RESPONSE_CACHE = False
+    run_eval.REPLAY_ONLY = False
+    run_eval.ASYNC_MODE = False
+    run_eval.DATA_DIR = "data"
+    run_eval.POSITION_RANGE = run_eval.SAMPLE_FRACTION = None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_eval.evaluate(["easy", "normal", "hard"], results_file="eval_results.jsonl")
+    evaluate_seconds = time.perf_counter() - start
+    with open("eval_results.jsonl", "r", encoding="utf-8") as f:
+        scored = sum(1 for _ in f)
+
+    with open(os.path.join("data", "positions.jsonl"), "r", encoding="utf-8") as f:
+        kept = sum(1 for _ in f)
+    total = generate_seconds + evaluate_seconds
+    return {"positions": kept, "scored": scored, "generate_seconds": generate_seconds,
+            "evaluate_seconds": evaluate_seconds, "total": total, "per_position": total / max(kept, 1)}
+
+
+BENCHMARKS = {
+    "moves_to_position": bench_moves_to_position,
+    "describe_position": bench_describe_position,
+    "move_normalized_score": bench_move_normalized_score,
+    "play_game": bench_play_game,
+    "end_to_end": bench_end_to_end,
+}
+
+
+def headline(row):
+    """Seconds per call (micro-benchmarks) or per generated and evaluated position (end-to-end)."""
+    return row["median"] if "median" in row else row["per_position"]
+
+
+def compare(results, baseline, tolerance):
+    """Print each benchmark's headline time against the baseline; returns the names slower than tolerance allows."""
+    if baseline["meta"]["engine"] != results["meta"]["engine"]:
+        print(f"warning: baseline used engine {baseline['meta']['engine']}, this run {results['meta']['engine']}")
+    if baseline["meta"]["positions"] != results["meta"]["positions"]:
+        print("warning: baseline was run on a different position set")
+    slower = []
+    print(f"{'benchmark':<24} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, row in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            print(f"{name:<24} {'-':>12} {headline(row) * 1000:>10.3f}ms")
+            continue
+        change = headline(row) / headline(base) - 1
+        mark = ""
+        if change > tolerance:
+            mark = "  slower"
+            slower.append(name)
+        elif change < -tolerance:
+            mark = "  faster"
+        print(f"{name:<24} {headline(base) * 1000:>10.3f}ms {headline(row) * 1000:>10.3f}ms {change:>+8.1%}{mark}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--positions", type=int, default=50, help="size of the fixed position set")
+    parser.add_argument("--games", type=int, default=2, help="games for the play_game benchmark")
+    parser.add_argument("--plies", type=int, default=30, help="plies of each of those games")
+    parser.add_argument("--end-to-end", type=int, default=30, help="positions to generate and evaluate")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="stub model latency in seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", help="comma-separated benchmarks to run (default: all)")
+    parser.add_argument("--engine", help="UCI engine: a path, a command, or 'fake' "
+                                         "(default: $CHESS_ENGINE, else Stockfish on the PATH, else 'fake')")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change reported as slower/faster")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    positions, fingerprint = fixed_positions(args.positions)
+    engine = locate_engine(args.engine, fallback_to_fake=True)
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    results = {
+        "meta": {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "machine": platform.machine(), "cpus": os.cpu_count(),
+                 "engine": engine_label(engine),
+                 "positions": {"count": len(positions), "fingerprint": fingerprint}, "args": vars(args)},
+        "benchmarks": {},
+    }
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            use_engine(engine)
+            for name in names:
+                results["benchmarks"][name] = row = BENCHMARKS[name](positions, args)
+                print(f"{name:<24} {headline(row) * 1000:9.3f} ms  total {row['total']:8.3f}s")
+        finally:
+            evaluation.close_engine_pool()
+            if generate_data.engine is not None:
+                generate_data.engine.quit()
+                generate_data.engine = None
+            close_eval_cache()
+            os.chdir(cwd)
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        if slower:
+            raise SystemExit(f"slower than the baseline: {', '.join(slower)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Compact canonical dataset: one record per position, prompts rendered when they are needed.
+
+The store is two JSON lines files in the data directory:
+    games.jsonl      {"game_id", "moves"}: each game's SAN moves, once
+    positions.jsonl  {"pos_id", "difficulty", "game_id", "ply", "fen"}
+A position's move history is the first `ply` moves of its game, and the
+verbal, board and history prompts are rendered from the FEN and that history
+at evaluation time instead of being stored three times.
+
+Usage (convert the per-format files of a data directory into a store):
+    python dataset_store.py data
+"""
+import json
+import os
+import sys
+
+import chess
+
+from jsonl_index import JsonlIndex
+from rendering import board_text, describe_position, turn_string
+
+GAMES_FILE = "games.jsonl"
+POSITIONS_FILE = "positions.jsonl"
+DIFFICULTIES = ("hard", "normal", "easy")
+
+
+def has_store(data_dir):
+    return all(os.path.exists(os.path.join(data_dir, name)) for name in (GAMES_FILE, POSITIONS_FILE))
+
+
+def replay(moves):
+    """Board after a list of SAN moves, or None if one of them is invalid."""
+    board = chess.Board()
+    try:
+        for move in moves:
+            board.push_san(move)
+    except ValueError:
+        return None
+    return board
+
+
+class GameIndex:
+    """
+    Assigns move histories to games. A history that is a prefix of a known game
+    belongs to it; one that extends a known game lengthens it; anything else
+    starts a new game. Each lookup scans every game, so it is only used for
+    positions that do not say which game they come from (e.g. legacy files).
+    """
+
+    def __init__(self):
+        self.games = []
+
+    def add(self, moves):
+        """(game_id, ply) of a SAN move list."""
+        moves = list(moves)
+        extends = None
+        for game_id, game in enumerate(self.games):
+            if game[:len(moves)] == moves:
+                return game_id, len(moves)
+            if moves[:len(game)] == game and (extends is None or len(game) > len(self.games[extends])):
+                extends = game_id
+        if extends is None:
+            self.games.append(moves)
+            return len(self.games) - 1, len(moves)
+        self.games[extends] = moves
+        return extends, len(moves)
+
+
+class StoreWriter:
+    """Writes positions.jsonl as positions are added, then games.jsonl on close()."""
+
+    def __init__(self, output_dir="data"):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.index = GameIndex()
+        self._game_rows = {}  # caller's game_id -> store game_id
+        self.count = 0
+        self._file = open(os.path.join(output_dir, POSITIONS_FILE), "w", encoding="utf-8")
+
+    def add(self, difficulty, pos_id, moves, fen=None, game_id=None, ply=None):
+        """
+        Add a position reached by the SAN list moves. With the caller's game_id
+        (and ply) this is constant time; without, the game is looked up by
+        matching moves against every game so far (GameIndex).
+        """
+        if fen is None:
+            board = replay(moves)
+            fen = board.fen() if board is not None else chess.STARTING_FEN
+        if game_id is None:
+            game_id, ply = self.index.add(moves)
+        else:
+            games = self.index.games
+            row = self._game_rows.get(game_id)
+            if row is None:
+                row = self._game_rows[game_id] = len(games)
+                games.append(list(moves))
+            elif len(moves) > len(games[row]):
+                # Positions of a game can arrive out of order (e.g. hard before easy); keep the longest history
+                games[row] = list(moves)
+            game_id, ply = row, len(moves) if ply is None else ply
+        record = {"pos_id": pos_id, "difficulty": difficulty, "game_id": game_id, "ply": ply, "fen": fen}
+        self._file.write(json.dumps(record) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        with open(os.path.join(self.output_dir, GAMES_FILE), "w", encoding="utf-8") as f:
+            for game_id, moves in enumerate(self.index.games):
+                f.write(json.dumps({"game_id": game_id, "moves": " ".join(moves)}) + "\n")
+
+
+class DatasetStore:
+    """
+    Reads a store and renders the verbal (1), board (2) and history (3) formats of its positions.
+
+    positions.jsonl is read through its offset index (jsonl_index.py), so
+    only the position records that are selected get parsed.
+    """
+
+    def __init__(self, data_dir="data"):
+        self.games = {}
+        with open(os.path.join(data_dir, GAMES_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                obj = json.loads(line)
+                self.games[obj["game_id"]] = obj["moves"].split()
+        self.index = JsonlIndex(os.path.join(data_dir, POSITIONS_FILE))
+
+    def select(self, difficulty, pos_range=None, sample=None, seed=0):
+        """Position records of one difficulty picked as jsonl_index.select_rows does, in pos_id order."""
+        rows = self.index.select(pos_range, sample, seed, difficulty=difficulty)
+        return [rec for _, rec in self.index.records(rows)]
+
+    def positions(self, difficulty):
+        """Position records of one difficulty, in pos_id order."""
+        return self.select(difficulty)
+
+    def history(self, rec):
+        return " ".join(self.games[rec["game_id"]][:rec["ply"]])
+
+    def board(self, rec):
+        return chess.Board(rec["fen"])
+
+    def render(self, rec, data_format):
+        """
+        The same list run_eval's extract_verbal (1), extract_board (2) or
+        extract_history (3) builds from the per-format files, pos_id last.
+        """
+        moves = self.history(rec)
+        if data_format == 3:
+            return [moves, rec["pos_id"]]
+        board = self.board(rec)
+        turn = turn_string(board)
+        if data_format == 1:
+            return [describe_position(board, turn), moves, rec["pos_id"]]
+        if data_format == 2:
+            return [board_text(board), turn, moves, rec["pos_id"]]
+        raise ValueError(f"Unknown data format {data_format!r}, expected 1 (verbal), 2 (board) or 3 (history)")
+
+    def close(self):
+        self.index.close()
+
+
+def convert_legacy(data_dir="data"):
+    """Build the store from the <difficulty>_history.jsonl files of data_dir, keeping their pos_ids."""
+    writer = StoreWriter(data_dir)
+    try:
+        for difficulty in DIFFICULTIES:
+            path = os.path.join(data_dir, f"{difficulty}_history.jsonl")
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for i, line in enumerate(f, start=1):
+                    obj = json.loads(line)
+                    writer.add(difficulty, obj.get("pos_id", i), obj.get("move_history_copy", "").split())
+    finally:
+        writer.close()
+    return writer.count
+
+
+def main():
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "data"
+    count = convert_legacy(data_dir)
+    legacy = sum(os.path.getsize(os.path.join(data_dir, f"{d}_{fmt}.jsonl"))
+                 for d in DIFFICULTIES for fmt in ("history", "turn_board", "verbal")
+                 if os.path.exists(os.path.join(data_dir, f"{d}_{fmt}.jsonl")))
+    store = sum(os.path.getsize(os.path.join(data_dir, name)) for name in (GAMES_FILE, POSITIONS_FILE))
+    print(f"{count} positions: per-format files {legacy / 1024:.0f} KB, store {store / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Which UCI engine the scripts run.
+
+In order of precedence: an --engine option, the CHESS_ENGINE environment
+variable, then a Stockfish binary on the PATH or next to the scripts (as
+shipped in the project zip). Either setting takes a path, a command line
+("stockfish -x"), or "fake" for the bundled pure-Python stand-in
+(fake_uci_engine.py), optionally with its options: "fake --latency 0.05".
+
+Worker processes find the same engine because use_engine() also exports the
+choice through CHESS_ENGINE.
+"""
+import functools
+import os
+import shlex
+import shutil
+import sys
+
+ENGINE_ENV = "CHESS_ENGINE"
+FAKE = "fake"
+STOCKFISH_NAMES = ("stockfish", "stockfish-windows-x86-64-avx2", "stockfish-windows-x86-64-avx2.exe")
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_ENGINE_SCRIPT = os.path.join(HERE, "fake_uci_engine.py")
+
+
+class EngineNotFoundError(FileNotFoundError):
+    pass
+
+
+def engine_command(spec):
+    """Command (str or argv list) for chess.engine.SimpleEngine.popen_uci from an engine setting."""
+    if spec == FAKE or spec.startswith(FAKE + " "):
+        return [sys.executable, FAKE_ENGINE_SCRIPT, *shlex.split(spec[len(FAKE):])]
+    if os.path.exists(spec) or " " not in spec:
+        return spec
+    return shlex.split(spec)
+
+
+def engine_label(command):
+    """
+    Short, machine-independent name of an engine command, used in evaluation
+    cache keys: the binary's file name, or "fake_uci_engine.py" plus its
+    options, since those change the scores.
+    """
+    if isinstance(command, str):
+        return os.path.basename(command)
+    if len(command) > 1 and os.path.abspath(command[1]) == FAKE_ENGINE_SCRIPT:
+        return " ".join(["fake_uci_engine.py", *command[2:]])
+    return " ".join([os.path.basename(command[0]), *command[1:]])
+
+
+@functools.lru_cache(maxsize=None)
+def _locate(spec, fallback_to_fake):
+    if spec:
+        return engine_command(spec)
+    for name in STOCKFISH_NAMES:
+        found = shutil.which(name) or shutil.which(name, path=HERE) or shutil.which(name, path=os.getcwd())
+        if found:
+            return found
+    if fallback_to_fake:
+        return engine_command(FAKE)
+    raise EngineNotFoundError(
+        f"No UCI engine found: put Stockfish on the PATH, or set {ENGINE_ENV} (or --engine) to its path, "
+        f"or to '{FAKE}' for the bundled stand-in")
+
+
+def locate_engine(explicit=None, fallback_to_fake=False):
+    """
+    The engine command to run: explicit (e.g. an --engine option), else
+    $CHESS_ENGINE, else Stockfish found on the PATH or next to the scripts.
+    Raises EngineNotFoundError if there is none, unless fallback_to_fake.
+    """
+    return _locate(explicit or os.environ.get(ENGINE_ENV, ""), fallback_to_fake)
+
+
+def use_engine(spec):
+    """Make spec the engine of this process and of every worker process it starts."""
+    if spec:
+        os.environ[ENGINE_ENV] = spec
+    return locate_engine()
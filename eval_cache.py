@@ -0,0 +1,122 @@
+import json
+import sqlite3
+import threading
+
+import chess
+import chess.polyglot
+
+CACHE_PATH = "eval_cache.sqlite"
+
+
+class EvalCache:
+    """
+    On-disk cache of engine results, shared by generate_data.py and evaluation.py.
+
+    Entries are keyed by the Zobrist hash of the position plus a settings string
+    (engine, search limit, scoring method) so results from different searches
+    never mix. The EPD of the position is stored too and checked on lookup to
+    rule out hash collisions. Once the cache holds more than `max_entries`
+    rows, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=1_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS evals ("
+            " key TEXT PRIMARY KEY,"
+            " epd TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS evals_last_used ON evals (last_used)")
+        self._clock, self._size = self._conn.execute(
+            "SELECT COALESCE(MAX(last_used), 0), COUNT(*) FROM evals").fetchone()
+
+    @staticmethod
+    def key(board: chess.Board, settings: str):
+        return f"{chess.polyglot.zobrist_hash(board):016x}|{settings}"
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def get(self, board: chess.Board, settings: str):
+        """Return the cached value for this position and settings, or None."""
+        key = self.key(board, settings)
+        with self._lock:
+            row = self._conn.execute("SELECT epd, value FROM evals WHERE key = ?", (key,)).fetchone()
+            if row is None or row[0] != board.epd():
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE evals SET last_used = ? WHERE key = ?", (self._tick(), key))
+        return json.loads(row[1])
+
+    def put(self, board: chess.Board, settings: str, value):
+        """Store a JSON-serializable value for this position and settings."""
+        key = self.key(board, settings)
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO evals (key, epd, value, last_used) VALUES (?, ?, ?, ?)",
+                (key, board.epd(), json.dumps(value), self._tick()))
+            if cur.rowcount == 0:
+                self._conn.execute(
+                    "UPDATE evals SET epd = ?, value = ?, last_used = ? WHERE key = ?",
+                    (board.epd(), json.dumps(value), self._clock, key))
+            else:
+                self._size += 1
+            if self._size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Drop a tenth of the cache at once so eviction does not run on every insert
+        excess = self._size - self.max_entries + max(1, self.max_entries // 10)
+        self._conn.execute(
+            "DELETE FROM evals WHERE key IN (SELECT key FROM evals ORDER BY last_used LIMIT ?)", (excess,))
+        self._size = self._conn.execute("SELECT COUNT(*) FROM evals").fetchone()[0]
+
+    def __len__(self):
+        return self._size
+
+    def merge_counts(self, hits, misses):
+        """Add hit/miss counts from another process's cache (e.g. a worker), and re-count the rows it added."""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self._size = self._conn.execute("SELECT COUNT(*) FROM evals").fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"eval cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate), {self._size} entries"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_eval_cache():
+    """Return the shared evaluation cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EvalCache()
+        return _cache
+
+
+def close_eval_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+            _cache = None
@@ -1,41 +1,279 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
 import chess
 import chess.engine
 import numpy as np
-def move_normalized_score(board: chess.Board, move_str: str, time_limit: float = 0.05):
-    engine = chess.engine.SimpleEngine.popen_uci("stockfish-windows-x86-64-avx2")
+
+from engine_locator import engine_label, locate_engine
+from eval_cache import get_eval_cache
+from instrumentation import METRICS
+
+# None: found by engine_locator (--engine, $CHESS_ENGINE, or Stockfish on the PATH)
+ENGINE_PATH = None
+
+
+class EnginePool:
     """
-    Returns a normalized score (0-1) for a given move relative to all legal moves in the position.
+    A fixed-size pool of long-lived UCI engine processes.
+
+    Engines are started lazily, the first time the pool runs out of idle ones,
+    so a pool sized to the CPU count costs nothing until it is actually used.
+    Callers borrow an engine with `with pool.engine() as engine:` and it is
+    returned to the pool when the block exits.
     """
-    legal_moves = {board.san(move): move for move in board.legal_moves}
-    print (legal_moves)
-    if move_str not in legal_moves:
-        return 0
-    print("yes")
-    print(move_str)
-    try:
-        move = board.parse_san(move_str)
-    except:
-        return 0
-    print("still here")
-    legal_moves = list(board.legal_moves)
-    scores = []
 
+    def __init__(self, size=None, engine_path=None):
+        self.size = size or os.cpu_count() or 1
+        self.engine_path = engine_path or ENGINE_PATH or locate_engine()
+        self._idle = queue.Queue()
+        self._engines = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _acquire(self):
+        while True:
+            if self._closed:
+                raise RuntimeError("engine pool is closed")
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("engine pool is closed")
+                if len(self._engines) < self.size:
+                    with METRICS.timer("engine_spawn"):
+                        engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+                    self._engines.append(engine)
+                    return engine
+            # All engines are borrowed. Wait for one in short steps, so a close() or a discarded
+            # (dead) engine, which frees a slot for a new one, is noticed instead of waiting forever
+            try:
+                engine = self._idle.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if self._closed:
+                raise RuntimeError("engine pool is closed")
+            return engine
+
+    def _discard(self, engine):
+        with self._lock:
+            if engine in self._engines:
+                self._engines.remove(engine)
+        try:
+            engine.quit()
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError):
+            pass
+
+    @contextmanager
+    def engine(self):
+        """Borrow an engine from the pool for the duration of a `with` block."""
+        engine = self._acquire()
+        terminated = False
+        try:
+            yield engine
+        except chess.engine.EngineTerminatedError:
+            # The process died under us; drop it so the next caller spawns a fresh one
+            terminated = True
+            raise
+        finally:
+            # Any other exception still hands the engine back, or the pool would run dry
+            if terminated or self._closed:
+                self._discard(engine)
+            else:
+                self._idle.put(engine)
+
+    def close(self):
+        """Quit every engine process owned by the pool."""
+        with self._lock:
+            self._closed = True
+            engines, self._engines = self._engines, []
+        for engine in engines:
+            try:
+                engine.quit()
+            except (chess.engine.EngineError, chess.engine.EngineTerminatedError):
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_engine_pool(size=None):
+    """Return the shared engine pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EnginePool(size)
+        return _pool
+
+
+def engine_path():
+    """The engine command the shared pool runs, or will run, without starting any engine."""
+    pool = _pool
+    return pool.engine_path if pool is not None else ENGINE_PATH or locate_engine()
+
+
+def close_engine_pool():
+    """
+    Shut down the shared engine pool.
+
+    The engines run their I/O on non-daemon threads, so this has to be called
+    before the script ends or the interpreter will wait on them forever.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+SCORING_METHODS = ("multipv", "per_child")
+
+
+def _per_child_scores(engine, board, legal_moves, time_limit):
+    """One search per legal move, on the position after the move is played."""
+    scores = []
     for m in legal_moves:
         board.push(m)
         info = engine.analyse(board, chess.engine.Limit(time=time_limit))
         board.pop()
-        score = info["score"].white().score(mate_score=100000)
-        scores.append(score)
+        scores.append(info["score"].white().score(mate_score=100000))
+    return scores
+
+
+def _multipv_scores(engine, board, legal_moves, time_limit):
+    """
+    Score every root move from a single MultiPV search.
 
+    If the engine reports fewer lines than requested, the moves it skipped are
+    searched again as a batch restricted to them with `searchmoves`.
+    """
+    found = {}
+    remaining = list(legal_moves)
+    while remaining:
+        infos = engine.analyse(board, chess.engine.Limit(time=time_limit),
+                               multipv=len(remaining), root_moves=remaining)
+        for info in infos:
+            pv = info.get("pv")
+            if pv and "score" in info and pv[0] not in found:
+                found[pv[0]] = info["score"].white().score(mate_score=100000)
+        missing = [m for m in remaining if m not in found]
+        if len(missing) == len(remaining):
+            raise chess.engine.EngineError("engine returned no scores for the requested root moves")
+        remaining = missing
+    return [found[m] for m in legal_moves]
+
+
+def legal_move_scores(board: chess.Board, time_limit: float = 0.05, method: str = "multipv", use_cache: bool = True):
+    """
+    Returns (legal_moves, raw_scores), the white-POV centipawn score of every legal move.
+
+    method="multipv" scores all root moves from one search; method="per_child"
+    is the original one-search-per-move scoring. Results are looked up in and
+    saved to the shared on-disk evaluation cache unless use_cache is False.
+    """
+    legal_moves = list(board.legal_moves)
+    if not legal_moves:
+        return legal_moves, []
+    if method == "multipv":
+        search = _multipv_scores
+    elif method == "per_child":
+        search = _per_child_scores
+    else:
+        raise ValueError(f"Unknown scoring method {method!r}, expected one of {SCORING_METHODS}")
+
+    # The pool (and its engine processes) is only created on a cache miss
+    settings = f"{engine_label(engine_path())}|{method}|time={time_limit}"
+    if use_cache:
+        cached = get_eval_cache().get(board, settings)
+        if cached is not None:
+            METRICS.count("eval_cache_hit")
+            return legal_moves, [cached[m.uci()] for m in legal_moves]
+        METRICS.count("eval_cache_miss")
+
+    with get_engine_pool().engine() as engine, METRICS.timer("analyse"):
+        scores = search(engine, board, legal_moves, time_limit)
+    if use_cache:
+        get_eval_cache().put(board, settings, {m.uci(): s for m, s in zip(legal_moves, scores)})
+    return legal_moves, scores
+
+
+def normalize_scores(scores):
+    """Min-max scale raw scores to 0-1; all-equal scores map to 0.5."""
     scores_array = np.array(scores, dtype=float)
     min_score = scores_array.min()
     max_score = scores_array.max()
 
     if max_score - min_score > 0:
-        normalized_scores = (scores_array - min_score) / (max_score - min_score)
-    else:
-        normalized_scores = np.ones_like(scores_array) * 0.5
+        return (scores_array - min_score) / (max_score - min_score)
+    return np.ones_like(scores_array) * 0.5
+
+
+def legal_sans(board: chess.Board):
+    """Every legal move of the position, keyed by its SAN."""
+    return {board.san(move): move for move in board.legal_moves}
+
+
+def move_normalized_scores(board: chess.Board, move_strs, time_limit: float = 0.05, method: str = "multipv",
+                           use_cache: bool = True, index=None):
+    """
+    Returns the normalized score (0-1) of every move in move_strs, in order.
+
+    The legal-move score vector is computed once for the position and shared by
+    all candidates, so scoring every move extracted from one reply costs a single
+    search. Moves that are not legal SAN in the position score 0, and the engine
+    is not used at all if none of them is legal. Pass the position's
+    LegalMoveIndex as index to skip rebuilding the SAN of every legal move.
+    """
+    sans = index.sans if index is not None else legal_sans(board)
+    candidates = [sans.get(move_str) for move_str in move_strs]
+    if not any(candidates):
+        return [0 for _ in candidates]
+
+    legal_moves, scores = legal_move_scores(board, time_limit, method, use_cache)
+    move_to_score = dict(zip(legal_moves, normalize_scores(scores)))
+    return [0 if move is None else float(move_to_score[move]) for move in candidates]
+
+
+def max_move_normalized_score(board: chess.Board, move_strs, time_limit: float = 0.05, method: str = "multipv",
+                              use_cache: bool = True, index=None):
+    """Returns the best normalized score among move_strs, or 0 if there are none."""
+    return max(move_normalized_scores(board, move_strs, time_limit, method, use_cache, index), default=0)
+
+
+def move_normalized_score(board: chess.Board, move_str: str, time_limit: float = 0.05, method: str = "multipv",
+                          use_cache: bool = True):
+    """
+    Returns a normalized score (0-1) for a given move relative to all legal moves in the position.
+    """
+    return move_normalized_scores(board, [move_str], time_limit, method, use_cache)[0]
+
+
+def answer_key(board: chess.Board, time_limit: float = 0.05, method: str = "multipv", use_cache: bool = True):
+    """
+    Returns the normalized score of every legal move, keyed by both SAN and UCI.
+
+    generate_data.py stores this next to each position so run_eval.py can score
+    a reply with dictionary lookups instead of an engine search.
+    """
+    legal_moves, scores = legal_move_scores(board, time_limit, method, use_cache)
+    key = {}
+    for move, score in zip(legal_moves, normalize_scores(scores) if scores else []):
+        key[board.san(move)] = float(score)
+        key[move.uci()] = float(score)
+    return key
+
 
-    # Map moves to normalized scores
-    move_to_score = {m: s for m, s in zip(legal_moves, normalized_scores)}
-    return move_to_score.get(move, None)  # returns normalized score for given move
\ No newline at end of file
+def max_answer_key_score(key, move_strs):
+    """Returns the best score of move_strs according to a precomputed answer key, or 0 if none is legal."""
+    return max((key.get(move_str, 0) for move_str in move_strs), default=0)
@@ -0,0 +1,164 @@
+"""
+Local stand-in for the chess.com published-data archive API.
+
+Serves /pub/player/<user>/games/archives and /pub/player/<user>/games/YYYY/MM/pgn
+for the last N months, with deterministic synthetic games, ETag and
+Last-Modified headers and 304 answers to conditional requests.
+
+Usage:
+    python fake_archive_server.py --port 8766 --months 24 --games-per-month 20
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import chess
+import chess.pgn
+
+LAST_MODIFIED = formatdate(0, usegmt=True)
+
+
+def synthetic_month_pgn(username, year, month, games_per_month):
+    """Deterministic PGN of random legal games for one month; `username` plays every game."""
+    rng = random.Random(f"{username}/{year}/{month}")
+    out = []
+    for i in range(games_per_month):
+        board = chess.Board()
+        for _ in range(rng.randint(10, 80)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        game = chess.pgn.Game.from_board(board)
+        opponent = f"opponent{rng.randint(1, 500)}"
+        white, black = (username, opponent) if i % 2 == 0 else (opponent, username)
+        game.headers["Event"] = "Live Chess"
+        game.headers["Date"] = f"{year}.{month:02d}.{i % 28 + 1:02d}"
+        game.headers["White"] = white
+        game.headers["Black"] = black
+        game.headers["WhiteElo"] = str(rng.randint(2000, 2900))
+        game.headers["BlackElo"] = str(rng.randint(2000, 2900))
+        out.append(str(game))
+    return "\n\n".join(out) + "\n"
+
+
+class FakeArchiveServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, months=12, games_per_month=20, latency=0.0, error_rate=0.0, seed=None):
+        super().__init__(address, FakeArchiveHandler)
+        self.months = months
+        self.games_per_month = games_per_month
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.hits = Counter()
+        self._pgn_cache = {}
+
+    def month_list(self):
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        year, month = today.year, today.month
+        months = []
+        for _ in range(self.months):
+            months.append((year, month))
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        return list(reversed(months))
+
+    def pgn(self, username, year, month):
+        key = (username, year, month)
+        with self.lock:
+            if key not in self._pgn_cache:
+                self._pgn_cache[key] = synthetic_month_pgn(username, year, month, self.games_per_month)
+            return self._pgn_cache[key]
+
+    def inject_error(self):
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+
+class FakeArchiveHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if server.inject_error():
+            self.send(429, b"Too Many Requests", "text/plain", {"Retry-After": "0"})
+            return
+
+        match = re.fullmatch(r"/pub/player/([^/]+)/games/archives", self.path)
+        if match:
+            username = match.group(1)
+            base = f"http://{self.headers.get('Host')}/pub/player/{username}/games"
+            archives = [f"{base}/{y}/{m:02d}" for y, m in server.month_list()]
+            self.send(200, json.dumps({"archives": archives}).encode("utf-8"), "application/json")
+            return
+
+        match = re.fullmatch(r"/pub/player/([^/]+)/games/(\d{4})/(\d{2})/pgn", self.path)
+        if match:
+            body = server.pgn(match.group(1), int(match.group(2)), int(match.group(3))).encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send(304, b"", None, {"ETag": etag, "Last-Modified": LAST_MODIFIED})
+                return
+            self.send(200, body, "application/x-chess-pgn", {"ETag": etag, "Last-Modified": LAST_MODIFIED})
+            return
+
+        self.send(404, b"Not Found", "text/plain")
+
+    def send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_archive_server(host="127.0.0.1", port=0, **options):
+    """Start a FakeArchiveServer on a background thread; port=0 picks a free port. Call .shutdown() to stop it."""
+    server = FakeArchiveServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--games-per-month", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeArchiveServer((args.host, args.port), args.months, args.games_per_month, args.latency,
+                               args.error_rate, args.seed)
+    print(f"Fake archive server on http://{args.host}:{server.server_address[1]}/pub/player/<username>/games/archives")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
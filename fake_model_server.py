@@ -0,0 +1,117 @@
+"""
+Local stand-in for an OpenAI-compatible chat model, for exercising run_eval.py without an API key.
+
+Every POST to /v1/chat/completions waits a configurable latency, fails with a
+configurable probability (429 or 503 by default) and otherwise replies with a
+short sentence naming a chess move.
+
+Usage:
+    python fake_model_server.py --port 8765 --latency 0.3 --jitter 0.2 --error-rate 0.1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_MOVES = ["e4", "d4", "Nf3", "c4", "O-O", "Qxd8", "Nc6", "e5", "Bb5", "Kh1"]
+
+
+class FakeModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.2, jitter=0.0, error_rate=0.0, error_statuses=(429, 503), seed=None):
+        super().__init__(address, FakeModelHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.requests_served = 0
+        self.errors_injected = 0
+
+    def draw(self):
+        """Return (delay, error status or None) for one request."""
+        with self.rng_lock:
+            self.requests_served += 1
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            if self.rng.random() < self.error_rate:
+                self.errors_injected += 1
+                return delay, self.rng.choice(self.error_statuses)
+            return delay, None
+
+    def reply(self):
+        with self.rng_lock:
+            return f"I would play {self.rng.choice(REPLY_MOVES)}."
+
+
+class FakeModelHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        delay, error = self.server.draw()
+        time.sleep(delay)
+        if error is not None:
+            self.send_json(error, {"error": {"message": "injected failure", "code": error}})
+            return
+
+        self.send_json(200, {
+            "object": "chat.completion",
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.server.reply()},
+                "finish_reason": "stop",
+            }],
+        })
+
+    def send_json(self, status, obj):
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_model_server(host="127.0.0.1", port=0, **options):
+    """Start a FakeModelServer on a background thread; port=0 picks a free port. Call .shutdown() to stop it."""
+    server = FakeModelServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="mean seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency varies uniformly by +/- this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=[429, 503])
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeModelServer((args.host, args.port), args.latency, args.jitter, args.error_rate,
+                             args.error_statuses, args.seed)
+    print(f"Fake model server on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
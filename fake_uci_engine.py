@@ -0,0 +1,280 @@
+"""
+Local stand-in for Stockfish, for running the pipeline and the benchmarks on a machine without it.
+
+Speaks enough UCI for python-chess (uci, isready, ucinewgame, setoption
+MultiPV, position, go, stop, quit). A search scores every root move by
+material and piece-square tables with a two-ply lookahead and streams "info"
+lines depth by depth, like a real engine, until the depth limit or a stop
+command; other limits (time, nodes) end it at --max-depth. Scores depend only
+on the position and the options, never on timing, so runs are exactly
+repeatable, and --latency gives every search a fixed cost.
+
+Usage (select it with CHESS_ENGINE=fake, or CHESS_ENGINE="fake --latency 0.05"; see engine_locator.py):
+    python fake_uci_engine.py --latency 0.05 --eval pst
+"""
+import argparse
+import queue
+import sys
+import threading
+import time
+
+import chess
+
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900,
+                chess.KING: 0}
+MATE = 100_000
+GO_KEYWORDS = {"wtime", "btime", "winc", "binc", "movestogo", "depth", "nodes", "mate", "movetime", "infinite",
+               "ponder"}
+
+# Piece-square bonuses for White (the "simplified evaluation function" tables), rank 8 first; Black mirrors them
+_PST_ROWS = {
+    chess.PAWN: [0, 0, 0, 0, 0, 0, 0, 0,
+                 50, 50, 50, 50, 50, 50, 50, 50,
+                 10, 10, 20, 30, 30, 20, 10, 10,
+                 5, 5, 10, 25, 25, 10, 5, 5,
+                 0, 0, 0, 20, 20, 0, 0, 0,
+                 5, -5, -10, 0, 0, -10, -5, 5,
+                 5, 10, 10, -20, -20, 10, 10, 5,
+                 0, 0, 0, 0, 0, 0, 0, 0],
+    chess.KNIGHT: [-50, -40, -30, -30, -30, -30, -40, -50,
+                   -40, -20, 0, 0, 0, 0, -20, -40,
+                   -30, 0, 10, 15, 15, 10, 0, -30,
+                   -30, 5, 15, 20, 20, 15, 5, -30,
+                   -30, 0, 15, 20, 20, 15, 0, -30,
+                   -30, 5, 10, 15, 15, 10, 5, -30,
+                   -40, -20, 0, 5, 5, 0, -20, -40,
+                   -50, -40, -30, -30, -30, -30, -40, -50],
+    chess.BISHOP: [-20, -10, -10, -10, -10, -10, -10, -20,
+                   -10, 0, 0, 0, 0, 0, 0, -10,
+                   -10, 0, 5, 10, 10, 5, 0, -10,
+                   -10, 5, 5, 10, 10, 5, 5, -10,
+                   -10, 0, 10, 10, 10, 10, 0, -10,
+                   -10, 10, 10, 10, 10, 10, 10, -10,
+                   -10, 5, 0, 0, 0, 0, 5, -10,
+                   -20, -10, -10, -10, -10, -10, -10, -20],
+    chess.ROOK: [0, 0, 0, 0, 0, 0, 0, 0,
+                 5, 10, 10, 10, 10, 10, 10, 5,
+                 -5, 0, 0, 0, 0, 0, 0, -5,
+                 -5, 0, 0, 0, 0, 0, 0, -5,
+                 -5, 0, 0, 0, 0, 0, 0, -5,
+                 -5, 0, 0, 0, 0, 0, 0, -5,
+                 -5, 0, 0, 0, 0, 0, 0, -5,
+                 0, 0, 0, 5, 5, 0, 0, 0],
+    chess.QUEEN: [-20, -10, -10, -5, -5, -10, -10, -20,
+                  -10, 0, 0, 0, 0, 0, 0, -10,
+                  -10, 0, 5, 5, 5, 5, 0, -10,
+                  -5, 0, 5, 5, 5, 5, 0, -5,
+                  0, 0, 5, 5, 5, 5, 0, -5,
+                  -10, 5, 5, 5, 5, 5, 0, -10,
+                  -10, 0, 5, 0, 0, 0, 0, -10,
+                  -20, -10, -10, -5, -5, -10, -10, -20],
+    chess.KING: [-30, -40, -40, -50, -50, -40, -40, -30,
+                 -30, -40, -40, -50, -50, -40, -40, -30,
+                 -30, -40, -40, -50, -50, -40, -40, -30,
+                 -30, -40, -40, -50, -50, -40, -40, -30,
+                 -20, -30, -30, -40, -40, -30, -30, -20,
+                 -10, -20, -20, -20, -20, -20, -20, -10,
+                 20, 20, 0, 0, 0, 0, 20, 20,
+                 20, 30, 10, 0, 0, 10, 30, 20],
+}
+
+
+def _square_tables(use_pst):
+    """{(piece type, color): [value of that piece on each square 0..63]}, material plus (optionally) PST bonus."""
+    tables = {}
+    for piece_type, rows in _PST_ROWS.items():
+        for color in chess.COLORS:
+            table = []
+            for square in chess.SQUARES:
+                rank = chess.square_rank(square) if color == chess.BLACK else 7 - chess.square_rank(square)
+                bonus = rows[rank * 8 + chess.square_file(square)] if use_pst else 0
+                table.append(PIECE_VALUES[piece_type] + bonus)
+            tables[piece_type, color] = table
+    return tables
+
+
+class Evaluator:
+    """
+    Material (and piece-square) evaluation, updated move by move: the score of
+    a move is what it changes, so a two-ply search costs one table lookup per
+    reply instead of a full board evaluation.
+    """
+
+    def __init__(self, use_pst=True):
+        self.tables = _square_tables(use_pst)
+
+    def evaluate(self, board):
+        """Centipawns from the side to move's point of view."""
+        score = 0
+        for square, piece in board.piece_map().items():
+            value = self.tables[piece.piece_type, piece.color][square]
+            score += value if piece.color == board.turn else -value
+        return score
+
+    def gain(self, board, move):
+        """How much move changes the evaluation, for the side making it (board is before the move)."""
+        piece = board.piece_at(move.from_square)
+        color = piece.color
+        tables = self.tables
+        if move.promotion:
+            gain = tables[move.promotion, color][move.to_square] - tables[chess.PAWN, color][move.from_square]
+        else:
+            gain = tables[piece.piece_type, color][move.to_square] - tables[piece.piece_type, color][move.from_square]
+        if board.is_castling(move):
+            rank = chess.square_rank(move.from_square)
+            if board.is_kingside_castling(move):
+                rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+            else:
+                rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+            gain += tables[chess.ROOK, color][rook_to] - tables[chess.ROOK, color][rook_from]
+        elif board.is_en_passant(move):
+            captured = move.to_square - 8 if color == chess.WHITE else move.to_square + 8
+            gain += tables[chess.PAWN, not color][captured]
+        else:
+            captured = board.piece_at(move.to_square)
+            if captured is not None:
+                gain += tables[captured.piece_type, not color][move.to_square]
+        return gain
+
+    def root_scores(self, board, moves):
+        """
+        [(move, centipawns or MATE)] for each root move, best first (ties by
+        UCI, so the order is reproducible): the evaluation after the move and
+        the opponent's best reply.
+        """
+        base = self.evaluate(board)
+        scored = []
+        for move in moves:
+            after_move = base + self.gain(board, move)
+            board.push(move)
+            if board.is_checkmate():
+                score = MATE
+            elif board.is_stalemate() or board.is_insufficient_material():
+                score = 0
+            else:
+                score = after_move - max(self.gain(board, reply) for reply in board.legal_moves)
+            board.pop()
+            scored.append((move, score))
+        scored.sort(key=lambda item: (-item[1], item[0].uci()))
+        return scored
+
+
+class FakeEngine:
+    """
+    The UCI loop. Input is read on a separate thread, so a running search sees
+    "stop" between depths. latency seconds are spent on every search, spread
+    evenly over the depths it reports, so scaling can be load-tested with a
+    known, repeatable engine cost.
+    """
+
+    def __init__(self, max_depth=10, latency=0.0, use_pst=True, out=sys.stdout):
+        self.max_depth = max_depth
+        self.latency = latency
+        self.evaluator = Evaluator(use_pst)
+        self.out = out
+        self.board = chess.Board()
+        self.multipv = 1
+        self.commands = queue.Queue()
+        self.searches = 0
+
+    def send(self, line):
+        self.out.write(line + "\n")
+        self.out.flush()
+
+    def read_input(self, stream=sys.stdin):
+        for line in stream:
+            self.commands.put(line)
+        self.commands.put("quit")
+
+    def run(self):
+        threading.Thread(target=self.read_input, daemon=True).start()
+        while True:
+            tokens = self.commands.get().split()
+            if not tokens:
+                continue
+            command = tokens[0]
+            if command == "quit":
+                return
+            if command == "uci":
+                self.send("id name fake_uci_engine")
+                self.send("id author local stand-in")
+                self.send("option name MultiPV type spin default 1 min 1 max 500")
+                self.send("uciok")
+            elif command == "isready":
+                self.send("readyok")
+            elif command == "setoption" and "name" in tokens and "value" in tokens:
+                name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")])
+                if name.lower() == "multipv":
+                    self.multipv = int(tokens[tokens.index("value") + 1])
+            elif command == "position":
+                self.set_position(tokens)
+            elif command == "go":
+                self.go(tokens)
+
+    def set_position(self, tokens):
+        moves_at = tokens.index("moves") if "moves" in tokens else len(tokens)
+        self.board = chess.Board() if tokens[1] == "startpos" else chess.Board(" ".join(tokens[2:moves_at]))
+        for uci in tokens[moves_at + 1:]:
+            self.board.push_uci(uci)
+
+    def go(self, tokens):
+        self.searches += 1
+        depth = self.max_depth
+        if "depth" in tokens:
+            depth = min(depth, int(tokens[tokens.index("depth") + 1]))
+        moves = list(self.board.legal_moves)
+        if "searchmoves" in tokens:
+            moves = []
+            for uci in tokens[tokens.index("searchmoves") + 1:]:
+                if uci in GO_KEYWORDS:
+                    break
+                moves.append(chess.Move.from_uci(uci))
+        if not moves:
+            self.send("info depth 0 score " + ("mate 0" if self.board.is_checkmate() else "cp 0"))
+            self.send("bestmove (none)")
+            return
+
+        scored = self.evaluator.root_scores(self.board, moves)
+        for d in range(1, depth + 1):
+            for i, (move, score) in enumerate(scored[:self.multipv], start=1):
+                value = "mate 1" if score == MATE else f"cp {score}"
+                self.send(f"info depth {d} seldepth {d} multipv {i} score {value} nodes {d * len(moves)} "
+                          f"pv {move.uci()}")
+            if self._stopped(self.latency / depth):
+                break
+        self.send(f"bestmove {scored[0][0].uci()}")
+
+    def _stopped(self, wait=0.0):
+        """
+        True if "stop" arrives within wait seconds; other commands that arrive
+        meanwhile are put back for the main loop.
+        """
+        deadline = time.perf_counter() + wait
+        pending, stopped = [], False
+        while not stopped:
+            remaining = deadline - time.perf_counter()
+            try:
+                line = self.commands.get(timeout=remaining) if remaining > 0 else self.commands.get_nowait()
+            except queue.Empty:
+                break
+            if line.split()[:1] == ["stop"]:
+                stopped = True
+            else:
+                pending.append(line)
+        for line in pending:
+            self.commands.put(line)
+        return stopped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-depth", type=int, default=10, help="deepest depth reported when go has no depth limit")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every search takes")
+    parser.add_argument("--eval", choices=("pst", "material"), default="pst",
+                        help="material plus piece-square tables, or material only")
+    args = parser.parse_args()
+    FakeEngine(args.max_depth, args.latency, args.eval == "pst").run()
+
+
+if __name__ == "__main__":
+    main()
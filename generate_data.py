@@ -1,6 +1,7 @@
 import chess
 import chess.engine
 
+import argparse
 import requests
 import io
 import time
@@ -9,6 +10,18 @@ import chess.pgn
 import os
 import re
 import json
+import heapq
+import multiprocessing
+import multiprocessing.util
+
+from eval_cache import get_eval_cache
+from archive_downloader import ArchiveDownloader
+from evaluation import answer_key, close_engine_pool
+from position_dedup import BloomFilter, SeenPositions, position_key, text_key
+from rendering import board_to_array, render_position
+from dataset_store import StoreWriter
+from instrumentation import METRICS, finish, profile
+from engine_locator import engine_label, locate_engine, use_engine
 
 def parse_positions(file_content):
     """Parse positions from file content and return a list of position dictionaries."""
@@ -164,32 +177,81 @@ def parse_games(pgn_str_io, max_games=None):
             break
     return games
 
-def game_quality_metric(game):
-    h = game.headers
+def opponent_elo(h):
     white = (h.get("White","") or "").lower()
-    black = (h.get("Black","") or "").lower()
     # opponent rating (whichever side is NOT Magnus)
     try:
         if white == USERNAME.lower():
-            opp_elo = int(h.get("BlackElo", 0) or 0)
+            return int(h.get("BlackElo", 0) or 0)
         else:
-            opp_elo = int(h.get("WhiteElo", 0) or 0)
+            return int(h.get("WhiteElo", 0) or 0)
     except:
-        opp_elo = 0
+        return 0
+
+def game_quality_metric(game):
     # tie-break by number of moves
-    return (opp_elo, len(list(game.mainline_moves())))
-
-def fetch_and_select_top_games(top_n=10):
-    archives = get_archives()
-    all_games = []
-    for archive in archives:
-        print(f"Fetching: {archive}")
-        pgn_io = download_month_pgn(archive)
-        games = parse_games(pgn_io)
-        all_games.extend(games)
-        time.sleep(1)  # be polite
-    all_games.sort(key=game_quality_metric, reverse=True)
-    return all_games[:top_n]
+    return (opponent_elo(game.headers), len(list(game.mainline_moves())))
+
+_PGN_NOISE = re.compile(r"\{[^}]*\}|;[^\n]*|\$\d+|\d+\.(?:\.\.)?|1-0|0-1|1/2-1/2|\*")
+
+def count_plies(game_text):
+    """Number of mainline moves in one game's PGN text, counted from the movetext without parsing SAN."""
+    movetext = "\n".join(line for line in game_text.splitlines() if not line.lstrip().startswith("["))
+    movetext = _PGN_NOISE.sub(" ", movetext)
+    # Drop variations, innermost first
+    while "(" in movetext:
+        stripped = re.sub(r"\([^()]*\)", " ", movetext)
+        if stripped == movetext:
+            break
+        movetext = stripped
+    return len(movetext.split())
+
+def select_top_games(pgn_texts, top_n=10):
+    """
+    Stream games from PGN texts and return the top_n by game_quality_metric, fully parsed.
+
+    Only headers are read for most games: a game is skipped as soon as its
+    opponent Elo is below the worst game kept so far, and the rest are ranked
+    by (opponent Elo, number of moves) in a heap of at most top_n raw game
+    texts. Only the winners are parsed into chess.pgn.Game objects, so memory
+    does not grow with the number of games. Ties keep the earlier game, as the
+    stable sort in the old implementation did.
+    """
+    heap = []  # (metric, -sequence, game text); heap[0] is the worst game kept
+    sequence = 0
+    for pgn_text in pgn_texts:
+        handle = io.StringIO(pgn_text)
+        while True:
+            start = handle.tell()
+            headers = chess.pgn.read_headers(handle)
+            if headers is None:
+                break
+            sequence += 1
+            elo = opponent_elo(headers)
+            if len(heap) >= top_n and elo < heap[0][0][0]:
+                continue
+            game_text = pgn_text[start:handle.tell()]
+            entry = ((elo, count_plies(game_text)), -sequence, game_text)
+            if len(heap) < top_n:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heappushpop(heap, entry)
+    winners = sorted(heap, key=lambda entry: (entry[0], entry[1]), reverse=True)
+    return [chess.pgn.read_game(io.StringIO(game_text)) for _, _, game_text in winners]
+
+def fetch_and_select_top_games(top_n=10, base_url=BASE_URL, downloader=None):
+    # Archives are fetched concurrently under a polite rate limit; past months come from the on-disk cache
+    downloader = downloader or ArchiveDownloader(headers=HEADERS)
+    archives = downloader.get_archives(base_url)
+
+    def pgn_texts():
+        for archive, pgn_text in downloader.download_all(archives):
+            print(f"Fetching: {archive}")
+            yield pgn_text
+
+    top_games = select_top_games(pgn_texts(), top_n)
+    print(downloader.stats())
+    return top_games
 
 def format_game_as_lines(game):
     """Return one string:
@@ -233,28 +295,115 @@ def export_games_as_custom(games, filename="formatted_games.txt"):
 
 
 
-engine = chess.engine.SimpleEngine.popen_uci("stockfish-windows-x86-64-avx2")
-def get_top_3_moves(board):
+# None: found by engine_locator (--engine, $CHESS_ENGINE, or Stockfish on the PATH)
+ENGINE_PATH = None
+engine = None
+def engine_path():
+    return ENGINE_PATH or locate_engine()
+
+def get_engine():
+    """Start this process's engine on first use."""
+    global engine
+    if engine is None:
+        with METRICS.timer("engine_spawn"):
+            engine = chess.engine.SimpleEngine.popen_uci(engine_path())
+    return engine
+
+# Difficulty classification. "fixed" spends a flat CLASSIFY_TIME MultiPV-3 search on every ply.
+# "adaptive" deepens one ply at a time and stops once the easy/normal/hard bucket has been the
+# same for CLASSIFY_STABLE_DEPTHS depths in a row (and at least CLASSIFY_MIN_DEPTH is reached),
+# giving up at CLASSIFY_MAX_DEPTH or after CLASSIFY_NODES nodes. Depth and node limits do not
+# depend on machine speed, so adaptive results are reproducible and safe to cache.
+CLASSIFY_MODE = "adaptive"
+CLASSIFY_TIME = 0.1
+CLASSIFY_MIN_DEPTH = 8
+CLASSIFY_MAX_DEPTH = 18
+CLASSIFY_STABLE_DEPTHS = 3
+CLASSIFY_NODES = None
+MATE_SCORE = 100  # pawns credited to a forced mate, less a hundredth per move to mate
+
+classify_stats = {"plies": 0, "searched": 0, "engine_seconds": 0.0, "depth_total": 0, "early_stops": 0}
+
+
+def pawn_score(score):
+    """White-POV score in pawns; mates count as MATE_SCORE pawns instead of being dropped."""
+    return score.white().score(mate_score=MATE_SCORE * 100) / 100
 
-    infos = engine.analyse(board, chess.engine.Limit(time=0.1), multipv=3)
-    # Return top 3 or less if fewer candidate
-    scores = []
-    for info in infos:
-        score = info['score']
-        if not score.is_mate():  # ignore mate scores
-            scores.append(score.white().score() / 100)  # convert to centipawns
 
+@METRICS.timed("get_top_3_moves")
+def get_top_3_moves(board):
+    settings = f"{engine_label(engine_path())}|top3|time={CLASSIFY_TIME}|mate={MATE_SCORE}"
+    cached = get_eval_cache().get(board, settings)
+    if cached is not None:
+        METRICS.count("top3_cache_hit")
+        return cached
+
+    start = time.perf_counter()
+    infos = get_engine().analyse(board, chess.engine.Limit(time=CLASSIFY_TIME), multipv=3)
+    classify_stats["searched"] += 1
+    classify_stats["engine_seconds"] += time.perf_counter() - start
+    # Return top 3 or less if fewer candidate
+    scores = [pawn_score(info["score"]) for info in infos if "score" in info]
 
+    get_eval_cache().put(board, settings, scores[:3])
     return scores[:3]
 
 
+@METRICS.timed("get_top_3_moves")
+def get_top_3_moves_adaptive(board, thresholds=(1, 0.5, 0)):
+    """
+    Top 3 scores from an iterative-deepening search that stops once the difficulty bucket is stable.
 
-def is_interesting_position(pos, threshold_hard=1, threshold_normal=0.5, threshold_easy=0):
-    moves=get_top_3_moves(pos)
-    if(len(moves)<3):
+    Each depth's MultiPV lines are read as the engine finishes them. The
+    engine's hash is cleared first (ucinewgame) so the result depends only on
+    the position and the limits, not on the positions searched before it.
+    """
+    settings = (f"{engine_label(engine_path())}|top3|depth={CLASSIFY_MIN_DEPTH}-{CLASSIFY_MAX_DEPTH}|stable={CLASSIFY_STABLE_DEPTHS}"
+                f"|nodes={CLASSIFY_NODES}|mate={MATE_SCORE}|gaps={thresholds}")
+    cached = get_eval_cache().get(board, settings)
+    if cached is not None:
+        METRICS.count("top3_cache_hit")
+        return cached
+
+    lines = min(3, board.legal_moves.count())
+    if lines < 3:
+        return []  # fewer than three candidates is never interesting; no need to search
+
+    start = time.perf_counter()
+    limit = chess.engine.Limit(depth=CLASSIFY_MAX_DEPTH, nodes=CLASSIFY_NODES)
+    scores, current, last_bucket, stable, depth = {}, {}, None, 0, 0
+    with get_engine().analysis(board, limit, multipv=lines, game=object()) as analysis:
+        for info in analysis:
+            if "score" not in info or "multipv" not in info or info.get("lowerbound") or info.get("upperbound"):
+                continue
+            current[info["multipv"]] = pawn_score(info["score"])
+            if info["multipv"] < lines:
+                continue
+            # Every line of this depth is in
+            depth = info.get("depth", depth + 1)
+            scores = dict(current)
+            bucket = gap_bucket([scores[k] for k in sorted(scores)], *thresholds)
+            stable = stable + 1 if bucket == last_bucket else 1
+            last_bucket = bucket
+            if depth >= CLASSIFY_MIN_DEPTH and stable >= CLASSIFY_STABLE_DEPTHS:
+                classify_stats["early_stops"] += 1
+                break
+    classify_stats["searched"] += 1
+    classify_stats["engine_seconds"] += time.perf_counter() - start
+    classify_stats["depth_total"] += depth
+
+    # A node budget can end the search before one full depth; fall back to the partial lines
+    scores = [(scores or current)[k] for k in sorted(scores or current)]
+    get_eval_cache().put(board, settings, scores)
+    return scores
+
+
+def gap_bucket(scores, threshold_hard=1, threshold_normal=0.5, threshold_easy=0):
+    """Difficulty bucket of a top-3 score list: 2 hard, 1 normal, 0 easy, -1 not interesting."""
+    if len(scores) < 3:
         return -1
 
-    gap = abs(moves[0] - moves[2]) + abs(moves[0] - moves[1])
+    gap = abs(scores[0] - scores[2]) + abs(scores[0] - scores[1])
     if gap >= threshold_hard:
         return 2
     elif gap >= threshold_normal:
@@ -264,14 +413,31 @@ def is_interesting_position(pos, threshold_hard=1, threshold_normal=0.5, thresho
     else:
         return -1
 
-def board_to_array(board):
-    """Convert python-chess board to 8x8 array format."""
-    board_str = str(board)
-    rows = board_str.split("\n")
-    arr = []
-    for row in rows:
-        arr.append([c if c != "." else "." for c in row.split(" ")])
-    return arr
+
+def is_interesting_position(pos, threshold_hard=1, threshold_normal=0.5, threshold_easy=0):
+    classify_stats["plies"] += 1
+    if CLASSIFY_MODE == "adaptive":
+        moves = get_top_3_moves_adaptive(pos, (threshold_hard, threshold_normal, threshold_easy))
+    else:
+        moves = get_top_3_moves(pos)
+    return gap_bucket(moves, threshold_hard, threshold_normal, threshold_easy)
+
+
+def classify_report(stats=None):
+    """One line on engine time per searched ply, and the time saved against the fixed CLASSIFY_TIME search."""
+    stats = stats or classify_stats
+    searched = stats["searched"]
+    if not searched:
+        return f"classification: {stats['plies']} plies, none searched (all from cache)"
+    per_ply = stats["engine_seconds"] / searched
+    line = (f"classification ({CLASSIFY_MODE}): {stats['plies']} plies, {searched} searched, "
+            f"{per_ply * 1000:.1f} ms engine time per searched ply")
+    if CLASSIFY_MODE == "adaptive":
+        saved = CLASSIFY_TIME - per_ply
+        line += (f", {saved * 1000:.1f} ms ({saved / CLASSIFY_TIME:.0%}) saved vs fixed {CLASSIFY_TIME}s, "
+                 f"mean depth {stats['depth_total'] / searched:.1f}, {stats['early_stops']} stopped early")
+    return line
+
 
 def print_board_array(board):
     arr = board_to_array(board)
@@ -280,49 +446,33 @@ def print_board_array(board):
     print()
 
 
-def describe_position(board: chess.Board, turn: str):
-    # Mapping from piece letter to name
-    piece_names = {
-        'P': 'pawn', 'N': 'knight', 'B': 'bishop',
-        'R': 'rook', 'Q': 'queen', 'K': 'king',
-        'p': 'pawn', 'n': 'knight', 'b': 'bishop',
-        'r': 'rook', 'q': 'queen', 'k': 'king'
+def position_record(board_array, turn, move_history, verbal, board, fen=None, game_id=None):
+    """
+    A kept position, with the normalized score of every legal move as its
+    answer key, and the game and ply it comes from for the dataset store.
+    """
+    return {
+        "board": board_array,
+        "turn": turn,
+        "move_history": move_history,
+        "verbal": verbal,
+        "answer_key": answer_key(board),
+        "zobrist": position_key(board),
+        "fen": fen or board.fen(),
+        "game_id": game_id,
+        "ply": len(move_history),
     }
 
-    # Separate storage for white and black
-    white_pieces = {}
-    black_pieces = {}
-
-    for square in chess.SQUARES:  # iterate over all 64 squares
-        piece = board.piece_at(square)
-        if piece is None:
-            continue
-
-        symbol = piece.symbol()
-        name = piece_names[symbol]
-        sq_name = chess.square_name(square)
-
-        if piece.color == chess.WHITE:   # White pieces
-            white_pieces.setdefault(name, []).append(sq_name)
-        else:                            # Black pieces
-            black_pieces.setdefault(name, []).append(sq_name)
-
-    # Helper to format descriptions
-    def format_desc(color_pieces, color_name):
-        if not color_pieces:
-            return f"{color_name} has no pieces"
-        parts = []
-        for piece_type, squares in color_pieces.items():
-            parts.append(f"{piece_type}s on {', '.join(squares)}")
-        return f"{color_name} has " + "; ".join(parts)
 
-    white_desc = format_desc(white_pieces, "White")
-    black_desc = format_desc(black_pieces, "Black")
-
-    return white_desc + ". " + black_desc + ". " + turn + "."
-
-
-def play_game(moves,depth=3):
+@METRICS.timed("play_game")
+def play_game(moves,depth=3,game_id=None):
+    """
+    Classify every position of one game. moves are SAN strings (as read from
+    formatted_games.txt) or chess.Move objects straight from a game's mainline,
+    which skips the text round-trip and the SAN parsing. game_id (e.g. the
+    game's index in the run) goes into every record, so the dataset store
+    does not have to work out which game a position belongs to.
+    """
     global board
     move_history = []
     positions_hard = []
@@ -334,22 +484,25 @@ def play_game(moves,depth=3):
     print_board_array(board)
     turn="true"
     for move in moves:
-        move_history.append(move)
         try:
+            if isinstance(move, chess.Move):
+                move_history.append(board.san(move))
+                board.push(move)
+            else:
+                move_history.append(move)
+                board.push_san(move)
             copy_h=move_history.copy()
-            board.push_san(move)
-            copyB=board_to_array(board)
             interest_level=is_interesting_position(board)
-            if interest_level == 2:
-                verbal=describe_position(board,turn)
-                positions_hard.append([copyB,turn,copy_h,verbal])
-            elif interest_level == 1:
-                verbal=describe_position(board,turn)
-                positions_normal.append([copyB,turn,copy_h,verbal])
-
-            elif interest_level == 0:
-                verbal=describe_position(board,turn)
-                positions_easy.append([copyB,turn,copy_h,verbal])
+            if interest_level in (0, 1, 2):
+                # Array, verbal text and FEN from one pass over the bitboards, and only for kept plies
+                rendered=render_position(board,turn)
+                record=position_record(rendered.array,turn,copy_h,rendered.verbal,board,rendered.fen,game_id)
+                if interest_level == 2:
+                    positions_hard.append(record)
+                elif interest_level == 1:
+                    positions_normal.append(record)
+                else:
+                    positions_easy.append(record)
             if turn=="true":
                 turn="false"
             else:
@@ -363,6 +516,76 @@ def play_game(moves,depth=3):
 
 
 
+def game_moves(games):
+    """Yield each game's mainline as a list of chess.Move, ready for play_game."""
+    for game in games:
+        yield list(game.mainline_moves())
+
+
+def _init_worker():
+    """Process pool initializer: quit this worker's engines when the worker exits."""
+    def shutdown():
+        if engine is not None:
+            engine.quit()
+        close_engine_pool()
+    multiprocessing.util.Finalize(None, shutdown, exitpriority=10)
+
+
+def _play_game_job(job):
+    game_index, moves, depth = job
+    start = time.perf_counter()
+    before = dict(classify_stats)
+    cache = get_eval_cache()
+    cache_before = (cache.hits, cache.misses)
+    hard, normal, easy = play_game(moves, depth, game_index)
+    stats = {k: classify_stats[k] - before[k] for k in classify_stats}
+    cache_counts = (cache.hits - cache_before[0], cache.misses - cache_before[1])
+    # The worker's timings and cache counts go back with the result; the parent merges and reports them
+    return (game_index, hard, normal, easy, len(moves), time.perf_counter() - start, os.getpid(), stats,
+            cache_counts, METRICS.drain())
+
+
+def play_games_parallel(games, workers=None, depth=3):
+    """
+    Run play_game on every game across a pool of worker processes, one engine per worker.
+
+    Games are handed out one at a time as workers free up, and the results are
+    merged in game order (and ply order within a game), so the hard/normal/easy
+    lists are the same as a sequential run's. Prints positions/sec per worker.
+    """
+    workers = workers or os.cpu_count() or 1
+    per_game = [None] * len(games)
+    per_worker = {}
+    # spawn, not fork: engines and the eval cache connection must not be shared with the parent
+    ctx = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    with ctx.Pool(workers, initializer=_init_worker) as pool:
+        jobs = [(i, moves, depth) for i, moves in enumerate(games)]
+        for game_index, hard, normal, easy, plies, seconds, pid, stats, cache_counts, metrics in pool.imap_unordered(
+                _play_game_job, jobs):
+            per_game[game_index] = (hard, normal, easy)
+            METRICS.merge(metrics)
+            for k, v in stats.items():
+                classify_stats[k] += v
+            get_eval_cache().merge_counts(*cache_counts)
+            done_plies, busy = per_worker.get(pid, (0, 0.0))
+            per_worker[pid] = (done_plies + plies, busy + seconds)
+            print(f"game {game_index} done by worker {pid}: {plies} positions in {seconds:.1f}s")
+    elapsed = time.perf_counter() - start
+
+    all_hard, all_normal, all_easy = [], [], []
+    for hard, normal, easy in per_game:
+        all_hard.extend(hard)
+        all_normal.extend(normal)
+        all_easy.extend(easy)
+
+    total_plies = sum(plies for plies, _ in per_worker.values())
+    for pid, (plies, busy) in sorted(per_worker.items()):
+        print(f"worker {pid}: {plies} positions, {plies / busy:.2f} positions/sec")
+    print(f"{workers} workers: {total_plies} positions in {elapsed:.1f}s, {total_plies / elapsed:.2f} positions/sec")
+    return all_hard, all_normal, all_easy
+
+
 def parse_games_from_file(path):
     with open(path, 'r') as f:
         lines = [line.strip() for line in f if line.strip()]
@@ -390,9 +613,27 @@ def parse_games_from_file(path):
 
     return games
 
-def save_positions_to_jsonl(positions_hard, positions_normal, positions_easy, output_dir="data"):
+def save_positions_to_jsonl(positions_hard, positions_normal, positions_easy, output_dir="data", dedup=True,
+                           bloom_path=None, bloom_capacity=10_000_000, format_files=False):
+    """
+    Write the three difficulty datasets, dropping repeated positions as they are written.
+
+    Positions go to the canonical store (games.jsonl and positions.jsonl, see
+    dataset_store.py) plus a <difficulty>_answer_key.jsonl sidecar each. With
+    format_files=True the per-format <difficulty>_turn_board/_history/_verbal
+    files are written as well.
+
+    A position is identified by its Zobrist hash, so the same position reached
+    by different move orders (or in different games) is written once, in the
+    first bucket that has it (hard, then normal, then easy). The seen set is
+    kept in memory, or in an on-disk Bloom filter at `bloom_path` for very
+    large runs. pos_ids are consecutive over the positions kept.
+    """
     import os, json
     os.makedirs(output_dir, exist_ok=True)
+    seen = BloomFilter(bloom_path, bloom_capacity) if bloom_path else SeenPositions()
+    store = StoreWriter(output_dir)
+    total = kept = 0
 
     def format_board(b):
         if isinstance(b, str):
@@ -447,47 +688,96 @@ def save_positions_to_jsonl(positions_hard, positions_normal, positions_easy, ou
         pos_value = seq[2] if len(seq) > 2 else ""
         return pos_value, board, wtm, move_hist, verbal
 
+    def dedup_key(rec, move_history):
+        if isinstance(rec, dict) and rec.get("zobrist") is not None:
+            return rec["zobrist"]
+        # Records without a hash: replay the history, or fall back to a hash of the literal move string
+        moves = format_text(move_history)
+        b = chess.Board()
+        try:
+            for move in moves.split():
+                b.push_san(move)
+        except ValueError:
+            return text_key(moves)
+        return position_key(b)
+
     def write_dataset(positions, difficulty_name):
+        nonlocal total, kept
         turn_board_file = os.path.join(output_dir, f"{difficulty_name}_turn_board.jsonl")
         history_file    = os.path.join(output_dir, f"{difficulty_name}_history.jsonl")
         verbal_file     = os.path.join(output_dir, f"{difficulty_name}_verbal.jsonl")
+        answer_key_file = os.path.join(output_dir, f"{difficulty_name}_answer_key.jsonl")
 
-        with open(turn_board_file, "w", encoding="utf-8") as tb_f, \
-                open(history_file,    "w", encoding="utf-8") as hist_f, \
-                open(verbal_file,     "w", encoding="utf-8") as verb_f:
-
-            for i, rec in enumerate(positions, start=1):
+        answers = []
+        paths = (turn_board_file, history_file, verbal_file) if format_files else ()
+        files = [open(path, "w", encoding="utf-8") for path in paths]
+        try:
+            i = 0
+            for rec in positions:
                 pos_value, board, white_to_move, move_history, verbal = unpack(rec)
+                total += 1
+                if dedup and not seen.add(dedup_key(rec, move_history)):
+                    continue
+                i += 1
+                kept += 1
 
                 move_history_copy = move_history  # duplicate
+                if isinstance(rec, dict):
+                    store.add(difficulty_name, i, format_text(move_history).split(), rec.get("fen"),
+                              rec.get("game_id"), rec.get("ply"))
+                else:
+                    store.add(difficulty_name, i, format_text(move_history).split())
+
+                if files:
+                    tb_f, hist_f, verb_f = files
+                    tb_obj = {
+                        "pos_id": i,
+                        "position": pos_value,
+                        "turn": white_to_move,
+                        "board": format_board(board),
+                        "move_history_copy": format_text(move_history_copy)
+                    }
+                    hist_obj = {
+                        "pos_id": i,
+                        "position": pos_value,
+                        "move_history": format_text(move_history),
+                        "move_history_copy": format_text(move_history_copy)
+                    }
+                    verb_obj = {
+                        "pos_id": i,
+                        "position": pos_value,
+                        "verbal": format_text(verbal),
+                        "move_history_copy": format_text(move_history_copy)
+                    }
+
+                    tb_f.write(json.dumps(tb_obj, ensure_ascii=False) + "\n")
+                    hist_f.write(json.dumps(hist_obj, ensure_ascii=False) + "\n")
+                    verb_f.write(json.dumps(verb_obj, ensure_ascii=False) + "\n")
+
+                if isinstance(rec, dict) and rec.get("answer_key") is not None:
+                    answers.append({
+                        "pos_id": i,
+                        "move_history_copy": format_text(move_history_copy),
+                        "answer_key": rec["answer_key"]
+                    })
+        finally:
+            for f in files:
+                f.close()
+
+        # Sidecar answer key: normalized score of every legal move, so evaluation needs no engine
+        if answers:
+            with open(answer_key_file, "w", encoding="utf-8") as ak_f:
+                for obj in answers:
+                    ak_f.write(json.dumps(obj, ensure_ascii=False) + "\n")
 
-                tb_obj = {
-                    "pos_id": i,
-                    "position": pos_value,
-                    "turn": white_to_move,
-                    "board": format_board(board),
-                    "move_history_copy": format_text(move_history_copy)
-                }
-                hist_obj = {
-                    "pos_id": i,
-                    "position": pos_value,
-                    "move_history": format_text(move_history),
-                    "move_history_copy": format_text(move_history_copy)
-                }
-                verb_obj = {
-                    "pos_id": i,
-                    "position": pos_value,
-                    "verbal": format_text(verbal),
-                    "move_history_copy": format_text(move_history_copy)
-                }
-
-                tb_f.write(json.dumps(tb_obj, ensure_ascii=False) + "\n")
-                hist_f.write(json.dumps(hist_obj, ensure_ascii=False) + "\n")
-                verb_f.write(json.dumps(verb_obj, ensure_ascii=False) + "\n")
-
-    write_dataset(positions_hard, "hard")
-    write_dataset(positions_normal, "normal")
-    write_dataset(positions_easy, "easy")
+    try:
+        write_dataset(positions_hard, "hard")
+        write_dataset(positions_normal, "normal")
+        write_dataset(positions_easy, "easy")
+    finally:
+        seen.close()
+        store.close()
+    print(f"Saved {kept} of {total} positions ({total - kept} duplicates dropped)")
 
 def save_positions_to_txt(positions_hard, positions_normal, positions_easy, output_dir="data"):
     import os, json
@@ -586,75 +876,6 @@ def save_positions_to_txt(positions_hard, positions_normal, positions_easy, outp
 
 
 
-top_games = fetch_and_select_top_games(10)
-export_games_as_custom(top_games, "formatted_games.txt")
-games = parse_games_from_file("formatted_games.txt")
-
-all_hard, all_normal, all_easy = [], [], []
-
-for i, moves in enumerate(games):
-    print(i)
-    hard, normal, easy = play_game(moves,5)
-    all_hard.extend(hard)
-    all_normal.extend(normal)
-    all_easy.extend(easy)
-print(len(all_hard), len(all_normal), len(all_easy))
-save_positions_to_jsonl(all_hard, all_normal, all_easy)
-
-engine.quit()
-
-datasets_folder = "data"
-
-# List of all your files (in the datasets folder)
-file_names = [
-    "easy_history.txt",
-    "easy_turn_board.txt",
-    "easy_verbal.txt",
-    "hard_history.txt",
-    "hard_turn_board.txt",
-    "hard_verbal.txt",
-    "normal_history.txt",
-    "normal_turn_board.txt",
-    "normal_verbal.txt"
-]
-
-# Create full paths to the files
-file_list = [os.path.join(datasets_folder, filename) for filename in file_names]
-
-print("Starting deduplication process for all files in 'data' folder...")
-print("=" * 60)
-
-# Check if datasets folder exists
-if not os.path.exists(datasets_folder):
-    print(f"Error: '{datasets_folder}' folder not found!")
-    print("Please make sure the 'datasets' folder exists in the same directory as this script.")
-    exit(1)
-
-# Process each file
-for file_path in file_list:
-    filename = os.path.basename(file_path)
-    print(f"\n{'=' * 25}")
-    print(f"Processing: {filename}")
-    print('=' * 25)
-
-    # Check if file exists before processing
-    if os.path.exists(file_path):
-        # Generate output path in the same datasets folder
-        base_name = os.path.splitext(file_path)[0]
-        output_path = f"{base_name}_clean.txt"
-
-        success = process_file(file_path, output_path)
-        if success:
-            print(f"✓ Successfully processed {filename}")
-        else:
-            print(f"✗ Failed to process {filename}")
-    else:
-        print(f"✗ File not found: {file_path}")
-
-print(f"\n{'=' * 60}")
-print("Deduplication process completed!")
-print("Check the 'datasets' folder for '_clean.txt' files.")
-
 def txt_to_jsonl(txt_file, jsonl_file):
     with open(txt_file, "r", encoding="utf-8") as infile, open(jsonl_file, "w", encoding="utf-8") as outfile:
         for i, line in enumerate(infile, start=1):
@@ -663,189 +884,52 @@ def txt_to_jsonl(txt_file, jsonl_file):
     print(f"Converted {txt_file} → {jsonl_file}")
 
 
-def parse_jsonl_positions(file_content):
-    """Parse positions from JSONL file content and return a list of position dictionaries."""
-    positions = []
-
-    for line_num, line in enumerate(file_content.strip().split('\n'), 1):
-        line = line.strip()
-        if not line:
-            continue
-
-        try:
-            json_obj = json.loads(line)
-
-            # Store the original JSON object
-            position_data = {
-                'json_object': json_obj,
-                'line_number': line_num
-            }
-
-            # Extract move_history_copy for deduplication key
-            move_sequence = ""
-            if 'move_history_copy' in json_obj:
-                move_sequence = json_obj['move_history_copy']
-            elif 'move_history' in json_obj:
-                move_sequence = json_obj['move_history']
-            else:
-                # If no move history field found, use the entire JSON as key
-                move_sequence = json.dumps(json_obj, sort_keys=True)
-
-            position_data['unique_key'] = move_sequence
-            positions.append(position_data)
-
-        except json.JSONDecodeError as e:
-            print(f"Warning: Invalid JSON on line {line_num}: {e}")
-            print(f"Skipping line: {line[:100]}...")
-            continue
-
-    return positions
-
-
-def remove_duplicates(positions):
-    """Remove duplicate positions based on move sequences."""
-    seen_sequences = set()
-    unique_positions = []
-
-    for pos in positions:
-        if pos['unique_key'] not in seen_sequences:
-            seen_sequences.add(pos['unique_key'])
-            unique_positions.append(pos)
-
-    return unique_positions
-
-
-def format_jsonl_output(positions):
-    """Format positions back to JSONL format."""
-    output_lines = []
-
-    for pos in positions:
-        json_line = json.dumps(pos['json_object'], ensure_ascii=False)
-        output_lines.append(json_line)
-
-    return '\n'.join(output_lines)
-
-
-def process_jsonl_file(input_file_path, overwrite=True):
-    """Process a single JSONL file to remove duplicates."""
-
-    # Read input file
-    try:
-        with open(input_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except FileNotFoundError:
-        print(f"Error: File '{input_file_path}' not found.")
-        return False
-    except Exception as e:
-        print(f"Error reading file '{input_file_path}': {e}")
-        return False
-
-    # Parse positions
-    positions = parse_jsonl_positions(content)
-    print(f"Found {len(positions)} total positions in {input_file_path}")
-
-    # Remove duplicates
-    unique_positions = remove_duplicates(positions)
-    duplicates_removed = len(positions) - len(unique_positions)
-    print(f"Removed {duplicates_removed} duplicate positions")
-    print(f"Final count: {len(unique_positions)} unique positions")
-
-    # Skip writing if no duplicates were found
-    if duplicates_removed == 0:
-        print("No duplicates found - file unchanged")
-        return True
-
-    # Determine output path
-    if overwrite:
-        output_file_path = input_file_path
-        print(f"Overwriting original file: {input_file_path}")
-    else:
-        base_name = os.path.splitext(input_file_path)[0]
-        output_file_path = f"{base_name}_clean.jsonl"
-        print(f"Writing to new file: {output_file_path}")
-
-    # Write output file
-    try:
-        formatted_output = format_jsonl_output(unique_positions)
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            f.write(formatted_output)
-        print(f"✓ File updated successfully")
-        return True
-    except Exception as e:
-        print(f"Error writing output file '{output_file_path}': {e}")
-        return False
-
-
-def process_multiple_jsonl_files(file_paths, output_dir=None):
-    """Process multiple JSONL files and remove duplicates from each."""
-
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    for file_path in file_paths:
-        print(f"\nProcessing: {file_path}")
-
-        if output_dir:
-            filename = os.path.basename(file_path)
-            base_name = os.path.splitext(filename)[0]
-            output_path = os.path.join(output_dir, f"{base_name}_clean.jsonl")
+# Number of processes for play_game; each worker runs its own engine (1 = sequential in this process)
+WORKERS = os.cpu_count() or 1
+# Also write the selected games as text to formatted_games.txt (not needed by the pipeline itself)
+EXPORT_TEXT = False
+# Track already-written positions in an on-disk Bloom filter at this path instead of in memory (very large runs)
+DEDUP_BLOOM_PATH = None
+# Also write the per-format <difficulty>_turn_board/_history/_verbal files next to the canonical store
+WRITE_FORMAT_FILES = False
+# Per-stage timings (play_game, get_top_3_moves, analyse, engine_spawn, ...) are printed at the end; METRICS_FILE
+# also exports them ("*.prom": Prometheus text format, else JSON lines). PROFILE = "cprofile" or "pyinstrument"
+# profiles the game analysis (in this process only, so use it with WORKERS = 1).
+METRICS_FILE = None
+PROFILE = None
+PROFILE_OUTPUT = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download games, classify their positions and write the datasets.")
+    parser.add_argument("--engine", help="UCI engine: a path, a command, or 'fake' for fake_uci_engine.py "
+                                         "(default: $CHESS_ENGINE, else Stockfish on the PATH)")
+    args = parser.parse_args()
+    # Exported to the worker processes too; fails here, before any download, if there is no engine
+    use_engine(args.engine)
+    top_games = fetch_and_select_top_games(10)
+    if EXPORT_TEXT:
+        export_games_as_custom(top_games, "formatted_games.txt")
+    # Moves go straight from the parsed games into play_game, no text round-trip
+    games = game_moves(top_games)
+
+    with profile(PROFILE, PROFILE_OUTPUT):
+        if WORKERS > 1:
+            all_hard, all_normal, all_easy = play_games_parallel(list(games), WORKERS, 5)
         else:
-            output_path = None
-
-        process_jsonl_file(file_path, output_path)
-
-
-def remove_dup_jsonl():
-    datasets_folder = "data"
-
-    # List of all your JSONL files (in the datasets folder)
-    file_names = [
-        "easy_history.jsonl",
-        "easy_turn_board.jsonl",
-        "easy_verbal.jsonl",
-        "hard_history.jsonl",
-        "hard_turn_board.jsonl",
-        "hard_verbal.jsonl",
-        "normal_history.jsonl",
-        "normal_turn_board.jsonl",
-        "normal_verbal.jsonl"
-    ]
-
-    # Create full paths to the files
-    file_list = [os.path.join(datasets_folder, filename) for filename in file_names]
-
-    print("Starting deduplication process for all JSONL files in 'datasets' folder...")
-    print("=" * 60)
-
-    # Check if datasets folder exists
-    if not os.path.exists(datasets_folder):
-        print(f"Error: '{datasets_folder}' folder not found!")
-        print("Please make sure the 'datasets' folder exists in the same directory as this script.")
-        exit(1)
-
-    # Process each file
-    for file_path in file_list:
-        filename = os.path.basename(file_path)
-        print(f"\n{'=' * 25}")
-        print(f"Processing: {filename}")
-        print('=' * 25)
-
-        # Check if file exists before processing
-        if os.path.exists(file_path):
-            # Generate output path in the same datasets folder
-            base_name = os.path.splitext(file_path)[0]
-            output_path = f"{base_name}_clean.jsonl"
-
-            success = process_jsonl_file(file_path, output_path)
-            if success:
-                print(f"✓ Successfully processed {filename}")
-            else:
-                print(f"✗ Failed to process {filename}")
-        else:
-            print(f"✗ File not found: {file_path}")
-
-    print(f"\n{'=' * 60}")
-    print("Deduplication process completed!")
-    print("Check the 'data' folder for '_clean.jsonl' files.")
-
-remove_dup_jsonl()
+            all_hard, all_normal, all_easy = [], [], []
+
+            for i, moves in enumerate(games):
+                print(i)
+                hard, normal, easy = play_game(moves,5,i)
+                all_hard.extend(hard)
+                all_normal.extend(normal)
+                all_easy.extend(easy)
+    print(len(all_hard), len(all_normal), len(all_easy))
+    print(get_eval_cache().stats())
+    print(classify_report())
+    save_positions_to_jsonl(all_hard, all_normal, all_easy, bloom_path=DEDUP_BLOOM_PATH, format_files=WRITE_FORMAT_FILES)
+
+    if engine is not None:
+        engine.quit()
+    close_engine_pool()
+    finish(METRICS_FILE)
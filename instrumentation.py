@@ -0,0 +1,223 @@
+"""
+Per-stage timers and counters for run_eval.py and generate_data.py.
+
+    from instrumentation import METRICS
+    with METRICS.timer("model"):
+        response = model.generate(prompt)
+    METRICS.count("eval_cache_hit")
+
+Every timed block adds one sample to its stage; report() prints count, total,
+mean, p50, p95, p99 and max per stage, and export() writes the same numbers
+as JSON lines (one line per stage, appended, tagged with a run id so runs can
+be compared) or, for a *.prom path, in the Prometheus text format. profile()
+optionally wraps a whole run in cProfile or pyinstrument.
+
+Usage (compare the runs recorded in a JSON lines export):
+    python instrumentation.py metrics.jsonl --runs 2
+"""
+import argparse
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+class Metrics:
+    """Timing samples per stage and event counters of one process."""
+
+    def __init__(self):
+        self.samples = {}
+        self.counters = {}
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the `with` block as one sample of stage (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """Decorator form of timer()."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def observe(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def drain(self):
+        """Everything recorded so far, as plain data, and reset; for worker processes to send to the parent."""
+        snapshot = (self.samples, self.counters)
+        self.samples, self.counters = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        samples, counters = snapshot
+        for stage, values in samples.items():
+            self.samples.setdefault(stage, []).extend(values)
+        for name, n in counters.items():
+            self.count(name, n)
+
+    def summary(self):
+        """{stage: {"count", "total", "mean", "p50", "p95", "p99", "max"}} in seconds, slowest total first."""
+        stats = {}
+        for stage, values in self.samples.items():
+            values = np.asarray(values)
+            row = {"count": len(values), "total": float(values.sum()), "mean": float(values.mean())}
+            for q, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+                row[f"p{round(q * 100)}"] = float(value)
+            row["max"] = float(values.max())
+            stats[stage] = row
+        return dict(sorted(stats.items(), key=lambda item: -item[1]["total"]))
+
+    def report(self):
+        lines = [f"{'stage':<20} {'count':>8} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} "
+                 f"{'p99 ms':>9} {'max ms':>9}"]
+        for stage, s in self.summary().items():
+            lines.append(f"{stage:<20} {s['count']:>8} {s['total']:>9.3f} {s['mean'] * 1000:>9.2f} "
+                         f"{s['p50'] * 1000:>9.2f} {s['p95'] * 1000:>9.2f} {s['p99'] * 1000:>9.2f} "
+                         f"{s['max'] * 1000:>9.2f}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"{name:<20} {n:>8}")
+        return "\n".join(lines)
+
+    def export(self, path, run=None):
+        """Append this run's summary to a JSON lines file, or write it as Prometheus text if path ends in .prom."""
+        run = run or f"{_script_name()}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        if path.endswith(".prom"):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus(run))
+            return
+        with open(path, "a", encoding="utf-8") as f:
+            for stage, row in self.summary().items():
+                f.write(json.dumps({"run": run, "stage": stage, **row}) + "\n")
+            for name, n in sorted(self.counters.items()):
+                f.write(json.dumps({"run": run, "counter": name, "value": n}) + "\n")
+
+    def prometheus(self, run):
+        lines = ["# HELP chess_eval_stage_seconds Time spent per pipeline stage.",
+                 "# TYPE chess_eval_stage_seconds summary"]
+        for stage, row in self.summary().items():
+            labels = f'run="{run}",stage="{stage}"'
+            for q in QUANTILES:
+                lines.append(f'chess_eval_stage_seconds{{{labels},quantile="{q}"}} {row[f"p{round(q * 100)}"]}')
+            lines.append(f"chess_eval_stage_seconds_sum{{{labels}}} {row['total']}")
+            lines.append(f"chess_eval_stage_seconds_count{{{labels}}} {row['count']}")
+        lines += ["# HELP chess_eval_events_total Pipeline event counters.",
+                  "# TYPE chess_eval_events_total counter"]
+        for name, n in sorted(self.counters.items()):
+            lines.append(f'chess_eval_events_total{{run="{run}",event="{name}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+# The metrics of this process; modules record into it directly
+METRICS = Metrics()
+
+
+def finish(metrics_path=None, run=None):
+    """Print the per-stage report and, if metrics_path is set, export it."""
+    if not METRICS.samples and not METRICS.counters:
+        return
+    print(METRICS.report())
+    if metrics_path:
+        METRICS.export(metrics_path, run)
+        print(f"metrics written to {metrics_path}")
+
+
+@contextmanager
+def profile(kind=None, output=None):
+    """
+    Profile the `with` block with kind="cprofile" (stats saved to output, top
+    functions printed) or "pyinstrument" (optional dependency; HTML saved to
+    output, call tree printed). kind=None does nothing.
+    """
+    if kind is None:
+        yield
+        return
+    if kind == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(25)
+            print(text.getvalue())
+    elif kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError as e:
+            raise ImportError("profile='pyinstrument' needs the pyinstrument package (pip install pyinstrument)") from e
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            if output:
+                with open(output, "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+            print(profiler.output_text())
+    else:
+        raise ValueError(f"Unknown profiler {kind!r}, expected one of {PROFILERS}")
+
+
+def _script_name():
+    name = sys.argv[0].replace("\\", "/").rsplit("/", 1)[-1]
+    return name[:-3] if name.endswith(".py") else name or "python"
+
+
+def compare_runs(path, runs=2):
+    """Print p50/p95 per stage side by side for the last `runs` runs of a JSON lines export."""
+    by_run = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if "stage" in row:
+                by_run.setdefault(row["run"], {})[row["stage"]] = row
+    names = list(by_run)[-runs:]
+    stages = sorted({stage for name in names for stage in by_run[name]},
+                    key=lambda stage: -max(by_run[name].get(stage, {}).get("total", 0) for name in names))
+    width = max([24] + [len(name) for name in names])
+    print(f"{'stage':<20} " + " ".join(f"{name:>{width}}" for name in names))
+    for stage in stages:
+        cells = []
+        for name in names:
+            row = by_run[name].get(stage)
+            cell = f"{row['p50'] * 1000:.2f} / {row['p95'] * 1000:.2f} ms" if row else "-"
+            cells.append(f"{cell:>{width}}")
+        print(f"{stage:<20} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-stage timings of runs exported as JSON lines.")
+    parser.add_argument("path")
+    parser.add_argument("--runs", type=int, default=2, help="how many of the most recent runs to show")
+    args = parser.parse_args()
+    compare_runs(args.path, args.runs)
+
+
+if __name__ == "__main__":
+    main()
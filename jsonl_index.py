@@ -0,0 +1,126 @@
+import json
+import mmap
+import os
+import re
+
+import numpy as np
+
+INDEX_SUFFIX = ".idx.npy"
+# Difficulty column codes; -1 for lines without a difficulty (the per-format files hold one difficulty each)
+DIFFICULTIES = ("easy", "normal", "hard")
+_POS_ID = re.compile(rb'"pos_id":\s*(-?\d+)')
+_DIFFICULTY = re.compile(rb'"difficulty":\s*"(\w+)"')
+
+
+def build_index(path):
+    """
+    Write the sidecar index of a JSON lines file: one (byte offset, pos_id,
+    difficulty code) row per line, after a header row holding the file's size
+    and mtime so a changed file is re-indexed. Lines without a pos_id get
+    their line number.
+    """
+    rows = [(os.path.getsize(path), os.stat(path).st_mtime_ns, 0)]
+    codes = {name.encode(): code for code, name in enumerate(DIFFICULTIES)}
+    offset = 0
+    with open(path, "rb") as f:
+        for i, line in enumerate(f, start=1):
+            if line.strip():
+                match = _POS_ID.search(line)
+                difficulty = _DIFFICULTY.search(line)
+                rows.append((offset, int(match.group(1)) if match else i,
+                             codes.get(difficulty.group(1), -1) if difficulty else -1))
+            offset += len(line)
+    # Write and rename, so a process reading the index (e.g. another shard) never sees it half-written
+    tmp = f"{path}{INDEX_SUFFIX}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, np.array(rows, dtype=np.int64))
+    os.replace(tmp, path + INDEX_SUFFIX)
+
+
+def select_rows(pos_ids, pos_range=None, sample=None, seed=0):
+    """
+    Row numbers of the positions to use, in file order.
+
+    pos_range=(first, last) keeps pos_ids in that inclusive range; sample, a
+    fraction in (0, 1], then draws that share of the rows with a seeded RNG.
+    The same arguments always select the same rows. (Sharding is done by
+    shard_eval.shard_of, not here.)
+    """
+    pos_ids = np.asarray(pos_ids, dtype=np.int64)
+    rows = np.arange(len(pos_ids))
+    if pos_range is not None:
+        first, last = pos_range
+        rows = rows[(pos_ids >= first) & (pos_ids <= last)]
+    if sample is not None and len(rows):
+        count = max(1, round(len(rows) * sample))
+        rows = np.sort(np.random.default_rng(seed).choice(rows, size=min(count, len(rows)), replace=False))
+    return rows
+
+
+class JsonlIndex:
+    """
+    Random access to the records of a JSON lines file through a memory-mapped offset index.
+
+    The index (<file>.idx.npy) is built the first time a file is opened and
+    whenever the file changes afterwards. Records are read straight from an
+    mmap of the file, so only the lines actually requested are parsed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        if not self._fresh():
+            build_index(path)
+        rows = np.load(self.index_path, mmap_mode="r")
+        self.size = int(rows[0, 0])
+        self.offsets = rows[1:, 0]
+        self.pos_ids = rows[1:, 1]
+        self.difficulties = rows[1:, 2]
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def _fresh(self):
+        if not os.path.exists(self.index_path):
+            return False
+        rows = np.load(self.index_path, mmap_mode="r")
+        if rows.ndim != 2 or rows.shape[1] != 3:
+            return False  # written by an older version without the difficulty column
+        stat = os.stat(self.path)
+        return int(rows[0, 0]) == stat.st_size and int(rows[0, 1]) == stat.st_mtime_ns
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def line(self, row):
+        start = int(self.offsets[row])
+        end = int(self.offsets[row + 1]) if row + 1 < len(self.offsets) else self.size
+        return self._map[start:end]
+
+    def __getitem__(self, row):
+        return json.loads(self.line(row))
+
+    def find(self, pos_id):
+        """Row of a record with this pos_id, or None."""
+        guess = pos_id - 1
+        if 0 <= guess < len(self) and self.pos_ids[guess] == pos_id:
+            return guess  # dataset files number their lines 1, 2, 3, ...
+        rows = np.flatnonzero(self.pos_ids == pos_id)
+        return int(rows[0]) if len(rows) else None
+
+    def select(self, pos_range=None, sample=None, seed=0, difficulty=None):
+        """select_rows over the whole file, or over the lines of one difficulty only (row numbers of the file)."""
+        if difficulty is None:
+            return select_rows(self.pos_ids, pos_range, sample, seed)
+        rows = np.flatnonzero(self.difficulties == DIFFICULTIES.index(difficulty))
+        return rows[select_rows(self.pos_ids[rows], pos_range, sample, seed)]
+
+    def records(self, rows=None):
+        """Yield (row, record) for the given rows (default: every row), parsing only those lines."""
+        for row in range(len(self)) if rows is None else rows:
+            yield int(row), self[int(row)]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
@@ -0,0 +1,126 @@
+import asyncio
+import random
+import time
+
+# HTTP statuses worth retrying: rate limited or a transient server-side failure
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Async token bucket holding up to `per_minute` tokens, refilled evenly over a minute.
+
+    acquire(n) waits until n tokens are available and takes them. Requests
+    larger than the whole bucket are clamped to its capacity so they can
+    still go through once the bucket is full. A bucket can be shared by
+    several asyncio.run() calls in turn (e.g. one per data format), so the
+    token count carries over instead of starting full each time.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self._lock = None
+        self._loop = None
+
+    def _loop_lock(self):
+        # An asyncio.Lock belongs to one event loop; make a new one when the bucket is used from another
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        async with self._loop_lock():
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Requests-per-minute and (optionally) tokens-per-minute limits applied together."""
+
+    def __init__(self, requests_per_min=60, tokens_per_min=None):
+        self.requests = TokenBucket(requests_per_min) if requests_per_min else None
+        self.tokens = TokenBucket(tokens_per_min) if tokens_per_min else None
+
+    async def acquire(self, tokens=1):
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None:
+            await self.tokens.acquire(tokens)
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token) used for the tokens/min budget."""
+    return max(1, len(text) // 4)
+
+
+def status_of(exc):
+    """HTTP status carried by an exception from requests or google.api_core, if any."""
+    response = getattr(exc, "response", None)
+    if response is not None and isinstance(getattr(response, "status_code", None), int):
+        return response.status_code
+    for attr in ("code", "status_code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return int(value)
+    return None
+
+
+def is_retryable(exc):
+    status = status_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # No status at all: a dropped connection or a timeout
+    return isinstance(exc, (OSError, asyncio.TimeoutError))
+
+
+async def call_with_retries(generate_async, prompt, limiter=None, max_retries=5, base_delay=1.0, max_delay=60.0):
+    """
+    Await generate_async(prompt), retrying 429/5xx and network errors with jittered exponential backoff.
+
+    Every attempt, including retries, goes through the rate limiter.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            await limiter.acquire(estimate_tokens(prompt))
+        try:
+            return await generate_async(prompt)
+        except Exception as exc:
+            if attempt == max_retries or not is_retryable(exc):
+                raise
+            # Full jitter: sleep a random time up to the exponential backoff
+            await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+
+async def generate_all(generate_async, prompts, max_in_flight=8, requests_per_min=60, tokens_per_min=None,
+                       max_retries=5, base_delay=1.0, limiter=None):
+    """
+    Send every prompt with at most `max_in_flight` requests outstanding.
+
+    Returns the responses in the same order as `prompts`, whatever order they
+    complete in. Pass a RateLimiter as limiter to share one rate budget
+    across several calls; otherwise a fresh one is made from
+    requests_per_min and tokens_per_min.
+    """
+    if limiter is None:
+        limiter = RateLimiter(requests_per_min, tokens_per_min)
+    semaphore = asyncio.Semaphore(max_in_flight)
+    results = [None] * len(prompts)
+
+    async def worker(i, prompt):
+        async with semaphore:
+            results[i] = await call_with_retries(generate_async, prompt, limiter, max_retries, base_delay)
+
+    await asyncio.gather(*(worker(i, prompt) for i, prompt in enumerate(prompts)))
+    return results
+
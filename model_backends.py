@@ -0,0 +1,165 @@
+import asyncio
+import math
+import random
+import time
+
+import chess
+import requests
+
+
+class ModelBackend:
+    """
+    A model that answers a prompt with text.
+
+    Subclasses implement generate(prompt). agenerate(prompt) defaults to
+    running generate in a worker thread; backends with a native async client
+    override it.
+    """
+
+    name = "backend"
+
+    def generate(self, prompt):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt):
+        return await asyncio.to_thread(self.generate, prompt)
+
+
+class GeminiBackend(ModelBackend):
+    """Google Gemini through google.generativeai (imported only when this backend is used)."""
+
+    def __init__(self, model_name="gemini-1.5-flash", api_key="", generation_config=None):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.name = model_name
+        self.model = genai.GenerativeModel(model_name, generation_config=generation_config)
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
+    async def agenerate(self, prompt):
+        return (await self.model.generate_content_async(prompt)).text
+
+
+class OpenAICompatibleBackend(ModelBackend):
+    """Any server speaking the OpenAI /chat/completions API, e.g. a local LLM server or fake_model_server.py."""
+
+    def __init__(self, base_url, model_name="local", api_key="", timeout=60, generation_config=None):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.name = base_url + model_name
+        self.model_name = model_name
+        self.timeout = timeout
+        self.generation_config = generation_config or {}
+        self.session = requests.Session()
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def generate(self, prompt):
+        resp = self.session.post(self.url, timeout=self.timeout, json={
+            **self.generation_config,
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+        })
+        resp.raise_for_status()
+        return resp.json()["choices"][0]["message"]["content"]
+
+
+def history_board(prompt):
+    """Board reached by the SAN move list at the end of a history-format prompt, or None."""
+    moves = prompt.rsplit(":", 1)[-1].split()
+    board = chess.Board()
+    try:
+        for move in moves:
+            board.push_san(move)
+    except ValueError:
+        return None
+    return board if moves else None
+
+
+class StubBackend(ModelBackend):
+    """
+    Deterministic in-process stand-in for an LLM.
+
+    Replies "I would play <SAN>." where the move is legal with probability
+    `legal_rate` and otherwise a well-formed but illegal SAN; the same prompt
+    and seed always get the same reply. The position is found with
+    `board_for_prompt(prompt)` (by default, history-format prompts only);
+    when it is unknown the stub names a common opening move. Latency is
+    drawn from a fixed, uniform, exponential or lognormal distribution with
+    the given mean, so pipeline overhead can be measured with or without
+    realistic waits.
+    """
+
+    name = "stub"
+    LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+    FALLBACK_MOVES = ["e4", "d4", "Nf3", "c4", "e5", "Nc6"]
+
+    def __init__(self, legal_rate=0.8, latency="fixed", mean_latency=0.0, sigma=0.5, seed=0,
+                 board_for_prompt=history_board):
+        if latency not in self.LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {latency!r}, expected one of {self.LATENCY_DISTRIBUTIONS}")
+        self.legal_rate = legal_rate
+        self.latency = latency
+        self.mean_latency = mean_latency
+        self.sigma = sigma
+        self.board_for_prompt = board_for_prompt
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def draw_latency(self):
+        mean = self.mean_latency
+        if mean <= 0:
+            return 0.0
+        if self.latency == "fixed":
+            return mean
+        if self.latency == "uniform":
+            return self.rng.uniform(0, 2 * mean)
+        if self.latency == "exponential":
+            return self.rng.expovariate(1 / mean)
+        # lognormal whose mean (not median) is mean_latency
+        return self.rng.lognormvariate(math.log(mean) - self.sigma ** 2 / 2, self.sigma)
+
+    def reply(self, prompt):
+        self.calls += 1
+        # Seeded by the prompt, so the reply does not depend on the order requests complete in
+        rng = random.Random(f"{self.seed}|{prompt}")
+        board = self.board_for_prompt(prompt) if self.board_for_prompt else None
+        if board is None:
+            return f"I would play {rng.choice(self.FALLBACK_MOVES)}."
+        legal = [board.san(move) for move in board.legal_moves]
+        if legal and rng.random() < self.legal_rate:
+            return f"I would play {rng.choice(legal)}."
+        return f"I would play {illegal_san(board, rng)}."
+
+    def generate(self, prompt):
+        delay = self.draw_latency()
+        if delay:
+            time.sleep(delay)
+        return self.reply(prompt)
+
+    async def agenerate(self, prompt):
+        delay = self.draw_latency()
+        if delay:
+            await asyncio.sleep(delay)
+        return self.reply(prompt)
+
+
+def illegal_san(board, rng):
+    """A SAN-shaped move that is not legal in `board`."""
+    legal = {board.san(move) for move in board.legal_moves}
+    while True:
+        san = rng.choice("KQRBN") + rng.choice("abcdefgh") + rng.choice("12345678")
+        if san not in legal:
+            return san
+
+
+def make_backend(kind, model_name="gemini-1.5-flash", api_key="", base_url="", generation_config=None, **stub_options):
+    """Build the backend named by `kind`: "gemini", "openai" or "stub"."""
+    if kind == "gemini":
+        return GeminiBackend(model_name, api_key, generation_config)
+    if kind == "openai":
+        return OpenAICompatibleBackend(base_url, model_name, api_key, generation_config=generation_config)
+    if kind == "stub":
+        return StubBackend(**stub_options)
+    raise ValueError(f"Unknown backend {kind!r}, expected 'gemini', 'openai' or 'stub'")
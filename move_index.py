@@ -0,0 +1,54 @@
+import re
+
+import chess
+
+# Runs of characters that can appear in a move; everything else (spaces, punctuation, move numbers' dots) separates
+_TOKEN = re.compile(r"[A-Za-z0-9=+#-]+")
+
+
+class LegalMoveIndex:
+    """
+    Every legal move of a position under each spelling a reply is likely to use.
+
+    Built once per position: each move is indexed by its SAN ("Nxe5+"), the SAN
+    without check marks, without the capture "x", or without both ("Ne5"),
+    promotions without "=" ("e8Q"), castling with zeros ("0-0"), and UCI
+    ("g1e5", "e2-e4"). Matching is case-sensitive, so "b4" is only ever the
+    pawn move and never a bishop move.
+    """
+
+    def __init__(self, board: chess.Board):
+        self.sans = {}
+        self._spellings = {}
+        for move in board.legal_moves:
+            san = board.san(move)
+            self.sans[san] = move
+            for spelling in self._variants(san, move):
+                self._spellings.setdefault(spelling, san)
+
+    @staticmethod
+    def _variants(san, move):
+        bare = san.rstrip("+#")
+        variants = [san, bare, san.replace("x", ""), bare.replace("x", "")]
+        if "=" in bare:
+            variants += [v.replace("=", "") for v in variants]
+        if bare.startswith("O-O"):
+            variants += [v.replace("O", "0") for v in variants]
+        uci = move.uci()
+        variants += [uci, f"{uci[:2]}-{uci[2:]}"]
+        return variants
+
+    def find(self, text):
+        """SANs of the legal moves named in text, in order of first mention, each once."""
+        found = []
+        for match in _TOKEN.finditer(text):
+            san = self._spellings.get(match.group())
+            if san is not None and san not in found:
+                found.append(san)
+        return found
+
+    def __contains__(self, san):
+        return san in self.sans
+
+    def __len__(self):
+        return len(self.sans)
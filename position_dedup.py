@@ -0,0 +1,87 @@
+import hashlib
+import math
+import mmap
+import os
+
+import chess
+import chess.polyglot
+
+
+def position_key(board: chess.Board):
+    """64-bit Zobrist hash of a position; transpositions reached by different move orders get the same key."""
+    return chess.polyglot.zobrist_hash(board)
+
+
+def text_key(text):
+    """64-bit key of a string, stable across runs (unlike hash()), for records that cannot be replayed to a board."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class SeenPositions:
+    """In-memory set of position keys. add(key) is True the first time a key is seen."""
+
+    def __init__(self):
+        self._keys = set()
+
+    def add(self, key):
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        return True
+
+    def __len__(self):
+        return len(self._keys)
+
+    def close(self):
+        self._keys.clear()
+
+
+class BloomFilter:
+    """
+    On-disk Bloom filter of position keys, for runs too large to keep a set in memory.
+
+    The bit array lives in a memory-mapped file sized for `capacity` keys at
+    the given false-positive rate (about 1.2 MB per million keys at 1%), so
+    only the pages in use take memory. A false positive drops a position that
+    was in fact new; duplicates are never let through. The file is recreated
+    on open, so positions from an earlier run do not count as seen.
+    """
+
+    def __init__(self, path, capacity=10_000_000, error_rate=0.01):
+        self.path = path
+        self.bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.count = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.truncate((self.bits + 7) // 8)
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _positions(self, key):
+        # Double hashing on the two halves of the 64-bit Zobrist key, which are already uniformly random
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        new = False
+        for pos in self._positions(key):
+            byte, bit = divmod(pos, 8)
+            value = self._map[byte]
+            if not value & (1 << bit):
+                self._map[byte] = value | (1 << bit)
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
@@ -0,0 +1,76 @@
+import chess
+
+from move_index import LegalMoveIndex
+
+
+class _Node:
+    __slots__ = ("board", "children", "moves")
+
+    def __init__(self, board):
+        self.board = board
+        self.children = {}
+        self.moves = None
+
+
+class PositionTrie:
+    """
+    Boards reached by SAN move histories, built incrementally over a trie of moves.
+
+    The dataset files hold successive prefixes of the same games, and the three
+    format files repeat the same histories, so replaying every history from the
+    start position does quadratic work. Here each distinct ply is parsed and
+    pushed exactly once; later histories that share a prefix reuse the stored
+    boards. Keep one trie for a whole run to share work across files.
+
+    Boards keep only the moves since the last capture or pawn move (the last
+    halfmove_clock plies) on their move stack. Earlier positions can never
+    recur, so repetition checks, and the engine (python-chess sends the stack
+    as "position ... moves"), see the same repetitions as with the full game,
+    while copies stay short instead of growing with the game.
+    """
+
+    def __init__(self):
+        self.root = _Node(chess.Board())
+        self.pushes = 0
+
+    def board(self, moves_str):
+        """
+        Same position as run_eval.moves_to_position: the board after the
+        space-separated SAN moves, or None (with a message) if a move is invalid.
+        The returned board is a copy the caller may modify.
+        """
+        node = self._node(moves_str)
+        return None if node is None else node.board.copy()
+
+    def move_index(self, moves_str):
+        """
+        LegalMoveIndex of the position after moves_str, or None if a move is
+        invalid. It is built the first time and kept on the trie node, so the
+        three formats of a position share one index.
+        """
+        node = self._node(moves_str)
+        if node is None:
+            return None
+        if node.moves is None:
+            node.moves = LegalMoveIndex(node.board)
+        return node.moves
+
+    def _node(self, moves_str):
+        node = self.root
+        for move in moves_str.split():
+            child = node.children.get(move)
+            if child is None:
+                # The stack before the last irreversible move is dropped (copy(stack=0) keeps none)
+                board = node.board.copy(stack=node.board.halfmove_clock)
+                try:
+                    board.push_san(move)
+                except ValueError:
+                    print(f"Invalid move: {move}")
+                    return None
+                self.pushes += 1
+                child = node.children[move] = _Node(board)
+            node = child
+        return node
+
+    def __len__(self):
+        return self.pushes
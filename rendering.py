@@ -0,0 +1,127 @@
+from collections import namedtuple
+
+import chess
+
+
+def turn_string(board: chess.Board):
+    """
+    The turn value stored with every generated position: "true" after a move
+    by White (Black to move), "false" after a move by Black.
+    """
+    return "true" if board.turn == chess.BLACK else "false"
+
+
+def board_text(board: chess.Board):
+    """The board of a *_turn_board prompt: the rows of board_to_array, space-separated."""
+    return str(board)
+
+
+PIECE_NAMES = {chess.PAWN: "pawn", chess.KNIGHT: "knight", chess.BISHOP: "bishop", chess.ROOK: "rook",
+               chess.QUEEN: "queen", chess.KING: "king"}
+_SYMBOLS = {(piece_type, color): chess.piece_symbol(piece_type).upper() if color else chess.piece_symbol(piece_type)
+            for piece_type in chess.PIECE_TYPES for color in chess.COLORS}
+# Squares in the order str(board) prints them: rank 8 first, files a to h
+_DISPLAY_ORDER = [chess.square(file, rank) for rank in range(7, -1, -1) for file in range(8)]
+
+
+# The 8x8 array, verbal description and FEN of one position
+Rendering = namedtuple("Rendering", "array verbal fen")
+
+
+def _squares(board):
+    """
+    One pass over the twelve piece bitboards: the symbol on every square
+    (None if empty) and, per color, (first square, piece name, square names)
+    for each piece type present.
+    """
+    cells = [None] * 64
+    groups = {chess.WHITE: [], chess.BLACK: []}
+    for color in chess.COLORS:
+        for piece_type in chess.PIECE_TYPES:
+            mask = board.pieces_mask(piece_type, color)
+            if not mask:
+                continue
+            symbol = _SYMBOLS[piece_type, color]
+            squares = list(chess.scan_forward(mask))
+            for square in squares:
+                cells[square] = symbol
+            groups[color].append((squares[0], PIECE_NAMES[piece_type], [chess.SQUARE_NAMES[sq] for sq in squares]))
+    return cells, groups
+
+
+def _array(cells):
+    flat = [cells[square] or "." for square in _DISPLAY_ORDER]
+    return [flat[i:i + 8] for i in range(0, 64, 8)]
+
+
+def _verbal(groups, turn):
+    def format_desc(color_groups, color_name):
+        if not color_groups:
+            return f"{color_name} has no pieces"
+        # Piece types are listed in the order their first square comes up in chess.SQUARES (a1, b1, ..., h8)
+        parts = [f"{name}s on {', '.join(squares)}" for _, name, squares in sorted(color_groups)]
+        return f"{color_name} has " + "; ".join(parts)
+
+    white_desc = format_desc(groups[chess.WHITE], "White")
+    black_desc = format_desc(groups[chess.BLACK], "Black")
+    return white_desc + ". " + black_desc + ". " + turn + "."
+
+
+def _fen(board, cells):
+    rows = []
+    for rank in range(7, -1, -1):
+        row, empty = "", 0
+        for square in range(rank * 8, rank * 8 + 8):
+            symbol = cells[square]
+            if symbol is None:
+                empty += 1
+                continue
+            if empty:
+                row += str(empty)
+                empty = 0
+            row += symbol
+        rows.append(row + str(empty) if empty else row)
+    ep = chess.SQUARE_NAMES[board.ep_square] if board.ep_square is not None and board.has_legal_en_passant() else "-"
+    return (f"{'/'.join(rows)} {'w' if board.turn else 'b'} {board.castling_xfen()} {ep} "
+            f"{board.halfmove_clock} {board.fullmove_number}")
+
+
+def board_to_array(board):
+    """Convert python-chess board to 8x8 array format."""
+    cells, _ = _squares(board)
+    return _array(cells)
+
+
+def describe_position(board: chess.Board, turn: str):
+    """
+    Verbal description: each side's pieces by type with their squares, then
+    the turn string, e.g. "White has pawns on a2, b2; ... . Black has ... . true."
+    """
+    _, groups = _squares(board)
+    return _verbal(groups, turn)
+
+
+def render_position(board: chess.Board, turn: str = None):
+    """Array, verbal description and FEN of a position from one pass over its bitboards."""
+    cells, groups = _squares(board)
+    return Rendering(_array(cells), _verbal(groups, turn_string(board) if turn is None else turn), _fen(board, cells))
+
+
+def render_game(moves, plies=None):
+    """
+    Render the positions of a whole game at once: moves are SAN strings or
+    chess.Move objects, and the game is replayed a single time. Returns one
+    Rendering per ply (1 = after the first move), or only for the plies
+    listed in plies, with the turn strings play_game gives them.
+    """
+    wanted = None if plies is None else set(plies)
+    board = chess.Board()
+    renderings = []
+    for ply, move in enumerate(moves, start=1):
+        if isinstance(move, chess.Move):
+            board.push(move)
+        else:
+            board.push_san(move)
+        if wanted is None or ply in wanted:
+            renderings.append(render_position(board))
+    return renderings
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+
+from model_backends import ModelBackend
+
+RESPONSE_CACHE_PATH = "llm_responses.jsonl"
+
+
+class CacheMissError(KeyError):
+    """Raised in replay mode when a prompt has no recorded response."""
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of model replies in an append-only JSON lines file.
+
+    Each reply is stored under the SHA-256 of (model name, generation config,
+    prompt text), so changing any of them makes a new entry rather than
+    overwriting an old one. The whole file is loaded into memory when opened;
+    new replies are appended and flushed as they arrive. Replies in
+    `read_paths` are used too but never written there, so several processes
+    can share one cache file while each appends to its own.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, replay=False, read_paths=()):
+        self.path = path
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._missed = set()
+        self._lock = threading.Lock()
+        for existing in [*read_paths, path]:
+            if not os.path.exists(existing):
+                continue
+            with open(existing, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        obj = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a torn last line from an interrupted run
+                    self._entries[obj["key"]] = obj["text"]
+        self._file = None if replay else open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def key(model_name, generation_config, prompt):
+        payload = json.dumps([model_name, generation_config, prompt], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self.hits += 1
+            elif key not in self._missed:
+                # Retried requests look the same key up again; count the miss once
+                self._missed.add(key)
+                self.misses += 1
+            return text
+
+    def put(self, key, text):
+        if self.replay:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = text
+            self._file.write(json.dumps({"key": key, "text": text}, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"response cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate), {len(self)} entries"
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CachedBackend(ModelBackend):
+    """
+    Wraps a model backend and answers from a ResponseCache first.
+
+    In replay mode `backend` may be None: every prompt must already be cached,
+    and a missing one raises CacheMissError instead of calling a model.
+    """
+
+    def __init__(self, backend, cache, model_name, generation_config=None):
+        self.backend = backend
+        self.cache = cache
+        self.name = model_name
+        self.generation_config = generation_config
+
+    def _lookup(self, prompt):
+        key = ResponseCache.key(self.name, self.generation_config, prompt)
+        text = self.cache.get(key)
+        if text is None and self.cache.replay:
+            raise CacheMissError(f"no recorded response for prompt {prompt[:80]!r}")
+        return key, text
+
+    def cached(self, prompt):
+        """The recorded reply to prompt, or None (in replay mode a missing one raises CacheMissError)."""
+        return self._lookup(prompt)[1]
+
+    def generate(self, prompt):
+        key, text = self._lookup(prompt)
+        if text is None:
+            text = self.backend.generate(prompt)
+            self.cache.put(key, text)
+        return text
+
+    async def agenerate(self, prompt):
+        key, text = self._lookup(prompt)
+        if text is None:
+            text = await self.backend.agenerate(prompt)
+            self.cache.put(key, text)
+        return text
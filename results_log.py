@@ -0,0 +1,132 @@
+import json
+import math
+import os
+
+FSYNC_POLICIES = ("always", "batch", "never")
+
+
+def read_results(path):
+    """All records of a results log, skipping a torn last line left by a crash."""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def result_key(record):
+    return (record["difficulty"], record["format"], record["model"], record["pos_id"])
+
+
+class RunningTotal:
+    """
+    Exact running sum and count. Values are kept as Shewchuk partials (the
+    method behind math.fsum), so adding or removing one is cheap and the sum
+    is the same as math.fsum over all the values, in any order.
+    """
+
+    def __init__(self):
+        self.partials = []
+        self.count = 0
+
+    def _add(self, x):
+        partials = []
+        for y in self.partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                partials.append(lo)
+            x = hi
+        partials.append(x)
+        self.partials = partials
+
+    def add(self, value):
+        self._add(value)
+        self.count += 1
+
+    def remove(self, value):
+        self._add(-value)
+        self.count -= 1
+
+    def mean(self):
+        return math.fsum(self.partials) / self.count if self.count else 0.0
+
+
+class ResultsLog:
+    """
+    Append-only JSON lines log of scored positions, used to resume an evaluation.
+
+    Each record holds pos_id, difficulty, format, model, the raw response, the
+    extracted moves, the score and stage timings. The fsync policy decides how
+    much a crash can lose: "always" syncs after every record, "batch" after
+    every `fsync_every` records, and "never" leaves it to the OS.
+    """
+
+    def __init__(self, path, fsync="batch", fsync_every=20):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}, expected one of {FSYNC_POLICIES}")
+        self.path = path
+        self.fsync = fsync
+        self.fsync_every = fsync_every
+        self.records = read_results(path)
+        self._done = {result_key(r): r for r in self.records}
+        # Score totals per (difficulty, format, model), so average() does not rescan the log
+        self._totals = {}
+        for key, r in self._done.items():
+            self._total(key).add(r["score"])
+        self._unsynced = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, difficulty, data_format, model, pos_id):
+        return (difficulty, data_format, model, pos_id) in self._done
+
+    def append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self.fsync == "always" or (self.fsync == "batch" and self._unsynced >= self.fsync_every):
+            self.sync()
+        self.records.append(record)
+        key = result_key(record)
+        old = self._done.get(key)
+        if old is not None:
+            self._total(key).remove(old["score"])
+        self._done[key] = record
+        self._total(key).add(record["score"])
+
+    def _total(self, key):
+        total = self._totals.get(key[:3])
+        if total is None:
+            total = self._totals[key[:3]] = RunningTotal()
+        return total
+
+    def sync(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def scores(self, difficulty, data_format, model):
+        """Scores of every logged position for one difficulty, format and model."""
+        return [r["score"] for key, r in self._done.items() if key[:3] == (difficulty, data_format, model)]
+
+    def average(self, difficulty, data_format, model):
+        # Exact (fsum) totals: the same average whatever order the records were logged in (e.g. merged shards)
+        total = self._totals.get((difficulty, data_format, model))
+        return total.mean() if total is not None else 0.0
+
+    def close(self):
+        if self._file is not None:
+            if self.fsync != "never":
+                self.sync()
+            self._file.close()
+            self._file = None
@@ -1,20 +1,59 @@
 import re
 import ast
-import google.generativeai as genai
+import argparse
+import asyncio
 import numpy as np
 import chess
 import chess.engine
-from evaluation import move_normalized_score
-engine = chess.engine.SimpleEngine.popen_uci("stockfish-windows-x86-64-avx2")
+from evaluation import max_move_normalized_score, max_answer_key_score, close_engine_pool
+from eval_cache import get_eval_cache
+from llm_client import RateLimiter, generate_all
+from model_backends import make_backend
+from response_cache import ResponseCache, CachedBackend
+from position_trie import PositionTrie
+from results_log import ResultsLog
+from dataset_store import DatasetStore, has_store
+from jsonl_index import JsonlIndex
+from shard_eval import parse_shard, shard_of, shard_path
+from instrumentation import METRICS, PROFILERS, finish, profile
+from engine_locator import use_engine
 # === CONFIG ===
+# "gemini", "openai" (any OpenAI-compatible server at MODEL_BASE_URL) or "stub" (in-process fake, no network)
+BACKEND = "gemini"
 API_KEY = ""
+MODEL_NAME = "gemini-1.5-flash"
+GENERATION_CONFIG = None  # e.g. {"temperature": 0}; part of the response cache key
+# For BACKEND = "openai", e.g. fake_model_server.py at "http://127.0.0.1:8765/v1"
+MODEL_BASE_URL = ""
+# For BACKEND = "stub": share of legal replies and latency distribution ("fixed", "uniform", "exponential", "lognormal")
+STUB_OPTIONS = {"legal_rate": 0.8, "latency": "lognormal", "mean_latency": 0.5, "seed": 0}
+# Async mode keeps up to MAX_IN_FLIGHT requests open under the rate limits, retrying 429/5xx with backoff
+ASYNC_MODE = False
+MAX_IN_FLIGHT = 8
+REQUESTS_PER_MIN = 15
+TOKENS_PER_MIN = 1000000
+# Replies are cached by (model, generation config, prompt); replay mode re-scores offline from the cache only
+USE_RESPONSE_CACHE = True
+RESPONSE_CACHE_FILE = "llm_responses.jsonl"
+REPLAY_ONLY = False
+# Every scored position is appended here; a restarted run skips what is already logged
+RESULTS_FILE = "eval_results.jsonl"
+FSYNC_POLICY = "batch"  # "always" (after each record), "batch" (every FSYNC_EVERY records) or "never"
+FSYNC_EVERY = 20
+# Evaluate only part of a dataset: pos_ids in POSITION_RANGE (inclusive), then a seeded SAMPLE_FRACTION of them.
+# Lines are found through a sidecar offset index (<file>.idx.npy), so skipped positions are never parsed.
+POSITION_RANGE = None  # e.g. (400, 450)
+SAMPLE_FRACTION = None  # e.g. 0.05
+SAMPLE_SEED = 0
+# Per-stage timings (model, board, extract_moves, score, analyse, ...) are printed when the run ends.
+# METRICS_FILE also exports them: "*.prom" in Prometheus text format, anything else as JSON lines appended per run.
+# PROFILE = "cprofile" or "pyinstrument" profiles the whole run and saves the result to PROFILE_OUTPUT.
+METRICS_FILE = None  # e.g. "metrics.jsonl"
+PROFILE = None
+PROFILE_OUTPUT = None  # e.g. "run_eval.prof" (cProfile) or "run_eval.html" (pyinstrument)
 #DATA_FILE_V = "datasets/easy_verbal.txt"  # Change to your file
 #DATA_FILE_B="datasets/easy_turn_board.txt"
 
-# === SETUP GEMINI ===
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel("gemini-1.5-flash")
-
 
 def moves_to_position(moves_str):
     """
@@ -33,6 +72,7 @@ def moves_to_position(moves_str):
     return board
 # === UTILITIES ===
 def extract_all_chess_moves(text):
+    # Every SAN-looking token, legal or not; run_eval now uses LegalMoveIndex.find, this is kept for comparison
     # Normalize text
     for char in '()*\n/':
         text = text.replace(char, ' ')
@@ -42,123 +82,308 @@ def extract_all_chess_moves(text):
 
 
 import json
+import os
+import time
+
+def read_positions(file_path):
+    """(line number, record) for the selected positions of a dataset file, read through its offset index"""
+    index = JsonlIndex(file_path)
+    try:
+        rows = index.select(POSITION_RANGE, SAMPLE_FRACTION, SAMPLE_SEED)
+        return [(int(index.pos_ids[row]), obj) for row, obj in index.records(rows)]
+    finally:
+        index.close()
 
 def extract_history(file_path):
-    """Extract only the move history from a *_history.jsonl file"""
+    """Extract only the move history (and pos_id) from a *_history.jsonl file"""
     history_array = []
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            obj = json.loads(line)
-            moves = obj.get("move_history_copy", "")
-            history_array.append([moves])
+    for i, obj in read_positions(file_path):
+        moves = obj.get("move_history_copy", "")
+        history_array.append([moves, obj.get("pos_id", i)])
     return history_array
 
 
 def extract_board(file_path):
-    """Extract board, turn, and move history from a *_turn_board.jsonl file"""
+    """Extract board, turn, move history (and pos_id) from a *_turn_board.jsonl file"""
     history_array = []
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            obj = json.loads(line)
-            board_str = obj.get("board", "")
-            turn = obj.get("turn", None)
-            moves = obj.get("move_history_copy", "")
-            history_array.append([board_str, turn, moves])
+    for i, obj in read_positions(file_path):
+        board_str = obj.get("board", "")
+        turn = obj.get("turn", None)
+        moves = obj.get("move_history_copy", "")
+        history_array.append([board_str, turn, moves, obj.get("pos_id", i)])
     return history_array
 
 
 def extract_verbal(file_path):
-    """Extract verbal description and move history from a *_verbal.jsonl file"""
+    """Extract verbal description, move history (and pos_id) from a *_verbal.jsonl file"""
     result = []
+    for i, obj in read_positions(file_path):
+        description = obj.get("verbal", "")
+        moves = obj.get("move_history_copy", "")
+        if description:
+            result.append([description, moves, obj.get("pos_id", i)])
+    return result
+
+def extract_answer_key(file_path):
+    """Map move_history_copy to its precomputed answer key from a *_answer_key.jsonl file (empty if missing)"""
+    answer_keys = {}
+    if not os.path.exists(file_path):
+        return answer_keys
     with open(file_path, 'r', encoding='utf-8') as f:
         for line in f:
             obj = json.loads(line)
-            description = obj.get("verbal", "")
-            moves = obj.get("move_history_copy", "")
-            if description:
-                result.append([description, moves])
-    return result
+            answer_keys[obj.get("move_history_copy", "")] = obj.get("answer_key", {})
+    return answer_keys
+
+def build_prompt(pos, data_format):
+    """Return (prompt, move history) for one position of the given data format"""
+    if(data_format==1):
+        moves_str = pos[1]
+        if(pos[1]==True):
+            turn="white."
+        else:
+            turn="black."
+        prompt= pos[0]+" turn of "+turn
+    if(data_format==2):
+        moves_str = pos[2]
+        if(pos[1]==True):
+            turn="white."
+        else:
+            turn="black."
+        # convert each row into a list of characters, ignoring spaces
+        board_2d = [row.split() for row in pos[0].split("\n")]
+        prompt = f"the board is:\n{board_2d}\n\nturn of {turn}\n"
+    if (data_format==3):
+        moves_str = pos[0]
+        prompt=pos[0]
+    prompt="What would you play in this position just what move make sure it legal move: "+prompt
+    return prompt, moves_str
+
+def setup_model(prompt_moves, position_trie, shard=None):
+    """
+    Build the configured model backend, wrapped in the response cache when enabled.
+    prompt_moves maps each prompt to its move history so the stub can answer with real moves.
+    A shard records new replies in its own cache file, next to the shared one it also reads.
+    Returns (model, response cache or None).
+    """
+    if REPLAY_ONLY:
+        backend = None
+    elif BACKEND == "stub":
+        def board_for_prompt(prompt):
+            return position_trie.board(prompt_moves[prompt]) if prompt in prompt_moves else None
+        backend = make_backend("stub", board_for_prompt=board_for_prompt, **STUB_OPTIONS)
+    else:
+        backend = make_backend(BACKEND, MODEL_NAME, API_KEY, MODEL_BASE_URL, GENERATION_CONFIG)
+    if not (USE_RESPONSE_CACHE or REPLAY_ONLY):
+        return backend, None
+    if shard and not REPLAY_ONLY:
+        response_cache = ResponseCache(shard_path(RESPONSE_CACHE_FILE, shard), read_paths=[RESPONSE_CACHE_FILE])
+    else:
+        response_cache = ResponseCache(RESPONSE_CACHE_FILE, replay=REPLAY_ONLY)
+    return CachedBackend(backend, response_cache, model_id(), GENERATION_CONFIG), response_cache
+
+def model_id():
+    """Name of the configured model, as used in the response cache and the results log"""
+    return BACKEND + ":" + MODEL_BASE_URL + MODEL_NAME
 
 dif=1 # chose here
 DATA_FILE_V = "data/easy_verbal.jsonl"  # Change to your file
 DATA_FILE_B="data/easy_turn_board.jsonl"
 DATA_FILE_H="data/easy_history.jsonl"
+DATA_FILE_A="data/easy_answer_key.jsonl"
 if dif==2:
     DATA_FILE_V = "data/normal_verbal.jsonl"  # Change to your file
     DATA_FILE_B="data/normal_turn_board.jsonl"
     DATA_FILE_H="data/normal_history.jsonl"
+    DATA_FILE_A="data/normal_answer_key.jsonl"
 if dif==3:
     DATA_FILE_V = "data/hard_verbal.jsonl"  # Change to your file
     DATA_FILE_B="data/hard_turn_board.jsonl"
     DATA_FILE_H="data/hard_history.jsonl"
-scoress=[]
-txtss=[]
-for j in range (1,4):
-    DATA_FORMAT=j
-    txt=""
-    # === MAIN ===
-    if(DATA_FORMAT==1):
-        positions = extract_verbal(DATA_FILE_V)
-        txt="verbel"
-    if(DATA_FORMAT==2):
-        positions = extract_board(DATA_FILE_B)
-        txt="board"
-    if(DATA_FORMAT==3):
-        positions = extract_history(DATA_FILE_H)
-        txt="history"
-    sum_score = 0
-    start=0
-    #len(positions)
-    for i in range(start, len(positions)):
-        pos=positions[i]
-        if(DATA_FORMAT==1):
-            board = moves_to_position(pos[1])
-        if DATA_FORMAT==2:
-
-            board = moves_to_position(pos[2])
-        if DATA_FORMAT==3:
-
-            board = moves_to_position(pos[0])
-        if (DATA_FORMAT==1):
-            if(pos[1]==True):
-                turn="white."
-            else:
-                turn="black."
-            prompt= pos[0]+" turn of "+turn
-        if(DATA_FORMAT==2):
-            if(pos[1]==True):
-                turn="white."
-            else:
-                turn="black."
-            rows = pos[0].split("\n")  # split into 8 rows
-    # convert each row into a list of characters, ignoring spaces
-            board_2d = [row.split() for row in pos[0].split("\n")]
-            prompt = f"the board is:\n{board_2d}\n\nturn of {turn}\n"
-        if (DATA_FORMAT==3):
-            prompt=pos[0]
-        prompt="What would you play in this position just what move make sure it legal move: "+prompt
-        # Build prompt depending on format
-        #if DATA_FORMAT == 3:
-        #  prompt = f"Here is the move list so far: {pos}. Suggest the next move."
-        #else:
-        #    prompt = f"Given this position:\n{pos}\nSuggest the next move."
-
-        # Call Gemini
-        response = model.generate_content(prompt)
-        moves = extract_all_chess_moves(response.text)
-        # Evaluate
-        max=0
-        for move in moves:
-            score =move_normalized_score(board,move)
-            if(score>max):
-                max=score
-        score=max
-        sum_score += score
-        print("round",i)
-        print("avg score in game "+str(sum_score/(i+1-start)) + " in this format " + txt)
-    scoress.append(sum_score/(i+1-start))
-    txtss.append(txt)
-for j in range (0,3):
-    print("final avg score in date format "+ txtss[j]+" "+str(scoress[i]))
+    DATA_FILE_A="data/hard_answer_key.jsonl"
+
+DIFFICULTY_NAMES = {1: "easy", 2: "normal", 3: "hard"}
+# With games.jsonl/positions.jsonl in DATA_DIR, prompts are rendered from the canonical store
+# and the per-format DATA_FILE_* files are not read
+DATA_DIR = "data"
+
+def dataset_files(difficulty):
+    """(verbal, board, history, answer key) files of a difficulty: the DATA_FILE_* settings for the one chosen by dif"""
+    if difficulty == DIFFICULTY_NAMES[dif]:
+        return DATA_FILE_V, DATA_FILE_B, DATA_FILE_H, DATA_FILE_A
+    return tuple(f"{DATA_DIR}/{difficulty}_{kind}.jsonl" for kind in ("verbal", "turn_board", "history", "answer_key"))
+
+def in_shard(difficulty, data_format, pos_id, shard):
+    return shard is None or shard_of(difficulty, data_format, pos_id, shard[1]) == shard[0]
+
+def evaluate(difficulties, shard=None, results_file=RESULTS_FILE):
+    """
+    Score the model on all three formats of each difficulty, appending every position to results_file.
+    With shard=(k, K) only the positions of shard k are evaluated; shard_eval.py merges the shards.
+    """
+    model_name = model_id()
+    # One trie for all formats and difficulties: every ply of the dataset is parsed and pushed only once
+    position_trie = PositionTrie()
+    prompt_moves = {}
+    model, response_cache = setup_model(prompt_moves, position_trie, shard)
+    results = ResultsLog(results_file, FSYNC_POLICY, FSYNC_EVERY)
+    # One rate budget for the whole run, shared by every format and difficulty
+    rate_limiter = RateLimiter(REQUESTS_PER_MIN, TOKENS_PER_MIN)
+    with METRICS.timer("load_store"):
+        store = DatasetStore(DATA_DIR) if has_store(DATA_DIR) else None
+    try:
+        for difficulty in difficulties:
+            data_file_v, data_file_b, data_file_h, data_file_a = dataset_files(difficulty)
+            # Answer keys written by generate_data.py let us score replies without running the engine
+            with METRICS.timer("load_answer_keys"):
+                answer_keys = extract_answer_key(data_file_a)
+            txtss=[]
+            for j in range (1,4):
+                DATA_FORMAT=j
+                txt=""
+                # === MAIN ===
+                if(DATA_FORMAT==1):
+                    txt="verbel"
+                if(DATA_FORMAT==2):
+                    txt="board"
+                if(DATA_FORMAT==3):
+                    txt="history"
+                txtss.append(txt)
+                load_start = time.perf_counter()
+                if store is not None:
+                    # Resume: positions already in the results log are not sent again, nor rendered
+                    # Only the selected lines of positions.jsonl are parsed, through its offset index
+                    positions = [rec for rec in store.select(difficulty, POSITION_RANGE, SAMPLE_FRACTION, SAMPLE_SEED)
+                                 if in_shard(difficulty, txt, rec["pos_id"], shard)]
+                    pending = [store.render(rec, DATA_FORMAT) for rec in positions
+                               if not results.is_done(difficulty, txt, model_name, rec["pos_id"])]
+                else:
+                    if(DATA_FORMAT==1):
+                        positions = extract_verbal(data_file_v)
+                    if(DATA_FORMAT==2):
+                        positions = extract_board(data_file_b)
+                    if(DATA_FORMAT==3):
+                        positions = extract_history(data_file_h)
+                    positions = [pos for pos in positions if in_shard(difficulty, txt, pos[-1], shard)]
+                    # Resume: positions already in the results log are not sent again
+                    pending = [pos for pos in positions if not results.is_done(difficulty, txt, model_name, pos[-1])]
+                METRICS.observe("load_positions", time.perf_counter() - load_start)
+                print(f"{len(positions) - len(pending)} of {len(positions)} positions already scored in this format " + txt)
+                with METRICS.timer("build_prompts"):
+                    prompts = [build_prompt(pos, DATA_FORMAT) for pos in pending]
+                prompt_moves.update(prompts)
+                model_seconds = {}
+                if ASYNC_MODE:
+                    async def timed_agenerate(prompt):
+                        start_time = time.perf_counter()
+                        text = await model.agenerate(prompt)
+                        model_seconds[prompt] = time.perf_counter() - start_time
+                        METRICS.observe("model", model_seconds[prompt])
+                        return text
+                    responses = [None] * len(prompts)
+                    if response_cache is not None:
+                        # Cached replies (all of them with REPLAY_ONLY) are read here, outside the rate limiter
+                        for i, (prompt, _) in enumerate(prompts):
+                            start_time = time.perf_counter()
+                            responses[i] = model.cached(prompt)
+                            if responses[i] is not None:
+                                model_seconds[prompt] = time.perf_counter() - start_time
+                                METRICS.observe("model", model_seconds[prompt])
+                    missing = [i for i, response in enumerate(responses) if response is None]
+                    if missing:
+                        # Responses come back in position order no matter when each request finishes
+                        fetched = asyncio.run(generate_all(timed_agenerate, [prompts[i][0] for i in missing],
+                                                           MAX_IN_FLIGHT, limiter=rate_limiter))
+                        for i, text in zip(missing, fetched):
+                            responses[i] = text
+                for i, pos in enumerate(pending):
+                    prompt, moves_str = prompts[i]
+                    start_time = time.perf_counter()
+                    board = position_trie.board(moves_str)
+                    board_seconds = time.perf_counter() - start_time
+                    METRICS.observe("board", board_seconds)
+                    # Build prompt depending on format
+                    #if DATA_FORMAT == 3:
+                    #  prompt = f"Here is the move list so far: {pos}. Suggest the next move."
+                    #else:
+                    #    prompt = f"Given this position:\n{pos}\nSuggest the next move."
+
+                    # Call the model
+                    if ASYNC_MODE:
+                        response = responses[i]
+                    else:
+                        start_time = time.perf_counter()
+                        response = model.generate(prompt)
+                        model_seconds[prompt] = time.perf_counter() - start_time
+                        METRICS.observe("model", model_seconds[prompt])
+                    # Only legal moves are extracted, as SAN, whether the reply wrote "Nxe5+", "Ne5" or "g1e5"
+                    with METRICS.timer("extract_moves"):
+                        move_index = position_trie.move_index(moves_str) if board is not None else None
+                        moves = move_index.find(response) if move_index is not None else []
+                    # Evaluate all extracted moves: answer key lookup, else one search of the position
+                    start_time = time.perf_counter()
+                    if moves_str in answer_keys:
+                        score = max_answer_key_score(answer_keys[moves_str], moves)
+                    elif moves:
+                        score = max_move_normalized_score(board, moves, index=move_index)
+                    else:
+                        score = 0
+                    legal = bool(moves)
+                    METRICS.observe("score", time.perf_counter() - start_time)
+                    results.append({
+                        "pos_id": pos[-1],
+                        "difficulty": difficulty,
+                        "format": txt,
+                        "model": model_name,
+                        "response": response,
+                        "moves": moves,
+                        "score": float(score),
+                        "legal": legal,
+                        "timings": {
+                            "model": model_seconds.get(prompt),
+                            "board": board_seconds,
+                            "score": time.perf_counter() - start_time,
+                        },
+                    })
+                    print("round",pos[-1])
+                    print("avg score in game "+str(results.average(difficulty, txt, model_name)) + " in this format " + txt)
+            # Final averages come from the log, so they include positions scored before a restart
+            prefix = ("shard %d/%d " % shard if shard else "") + (difficulty + ": " if len(difficulties) > 1 else "")
+            for txt in txtss:
+                print(prefix+"final avg score in date format "+ txt+" "+str(results.average(difficulty, txt, model_name)))
+
+    finally:
+        results.close()
+        if store is not None:
+            store.close()
+        if response_cache is not None:
+            print(response_cache.stats())
+            response_cache.close()
+        print(get_eval_cache().stats())
+        # Quit the pooled engines so the script exits on its own
+        close_engine_pool()
+        finish(METRICS_FILE)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the configured model on the chess datasets.")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="k/K: evaluate only shard k of K (see shard_eval.py)")
+    parser.add_argument("--difficulties", default=DIFFICULTY_NAMES[dif],
+                        help="comma-separated, e.g. easy,normal,hard (default: the one chosen by dif)")
+    parser.add_argument("--results", default=RESULTS_FILE,
+                        help="results log; a shard writes <name>.shard-k-of-K.jsonl next to it")
+    parser.add_argument("--metrics", default=METRICS_FILE,
+                        help="export per-stage timings here (*.prom: Prometheus text, else JSON lines)")
+    parser.add_argument("--profile", choices=PROFILERS, default=PROFILE, help="profile the whole run")
+    parser.add_argument("--profile-output", default=PROFILE_OUTPUT)
+    parser.add_argument("--engine", help="UCI engine for positions without an answer key: a path, a command, or "
+                                         "'fake' (default: $CHESS_ENGINE, else Stockfish on the PATH)")
+    args = parser.parse_args()
+    if args.engine:
+        use_engine(args.engine)
+    METRICS_FILE = args.metrics
+    with profile(args.profile, args.profile_output):
+        evaluate(args.difficulties.split(","), args.shard,
+                 shard_path(args.results, args.shard) if args.shard else args.results)
 
 # Final average
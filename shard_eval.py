@@ -0,0 +1,158 @@
+"""
+Sharded evaluation: split the (difficulty x format x position) work into K shards and merge the results.
+
+Every work item goes to shard crc32("<difficulty>|<format>|<pos_id>") mod K,
+so a shard's share of the work depends only on K, not on the machine or on
+the order positions are read. Each shard is an ordinary run_eval.py process
+with its own engine pool, LLM rate limits and results log, so shards can run
+side by side on one machine or on separate hosts. Merging the logs gives the
+same final averages as an unsharded run, whatever K is.
+
+Usage (from the repository root):
+    python shard_eval.py run --shards 4          # 4 local processes, then merge
+    python run_eval.py --shard 2/4               # one shard, e.g. on another host
+    python shard_eval.py merge eval_results.shard-*.jsonl
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import subprocess
+import sys
+import zlib
+
+from response_cache import RESPONSE_CACHE_PATH
+from results_log import read_results, result_key
+
+RESULTS_PATH = "eval_results.jsonl"
+DIFFICULTIES = ("easy", "normal", "hard")
+FORMATS = ("verbel", "board", "history")
+
+
+def shard_of(difficulty, data_format, pos_id, num_shards):
+    """Shard (0..num_shards-1) of one work item; stable across processes, hosts and Python versions."""
+    return zlib.crc32(f"{difficulty}|{data_format}|{pos_id}".encode("utf-8")) % num_shards
+
+
+def parse_shard(text):
+    """'k/K' -> (k, K)"""
+    k, n = (int(part) for part in text.split("/"))
+    if not 0 <= k < n:
+        raise ValueError(f"shard {text!r}: expected k/K with 0 <= k < K")
+    return k, n
+
+
+def shard_path(path, shard):
+    """eval_results.jsonl, (2, 4) -> eval_results.shard-2-of-4.jsonl"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.shard-{shard[0]}-of-{shard[1]}{ext}"
+
+
+def merge_results(paths, output_path=RESULTS_PATH):
+    """
+    Merge per-shard results logs into output_path (keeping what it already
+    holds): one record per (difficulty, format, model, pos_id), in a fixed
+    order. Returns the merged records.
+    """
+    merged = {}
+    for path in [output_path, *paths]:
+        for record in read_results(path):
+            merged.setdefault(result_key(record), record)
+    records = [merged[key] for key in sorted(merged, key=_order)]
+    with open(output_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return records
+
+
+def merge_response_caches(paths, output_path=RESPONSE_CACHE_PATH):
+    """Append the replies of per-shard response caches that output_path does not have yet."""
+    seen = set()
+    if os.path.exists(output_path):
+        seen.update(record["key"] for record in read_results(output_path))
+    added = 0
+    with open(output_path, "a", encoding="utf-8") as out:
+        for path in paths:
+            for record in read_results(path):
+                if record["key"] not in seen:
+                    seen.add(record["key"])
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    added += 1
+    return added
+
+
+def final_averages(records):
+    """{(model, difficulty, format): average score}; math.fsum makes it independent of record order."""
+    scores = {}
+    for record in records:
+        scores.setdefault((record["model"], record["difficulty"], record["format"]), []).append(record["score"])
+    return {key: math.fsum(values) / len(values) for key, values in scores.items()}
+
+
+def print_final_averages(records):
+    averages = final_averages(records)
+    for model, difficulty, data_format in sorted(averages, key=lambda k: (k[0], _rank(DIFFICULTIES, k[1]),
+                                                                          _rank(FORMATS, k[2]))):
+        count = sum(1 for r in records if (r["model"], r["difficulty"], r["format"]) == (model, difficulty, data_format))
+        print(f"{model} {difficulty}: final avg score in date format {data_format} "
+              f"{averages[model, difficulty, data_format]} ({count} positions)")
+
+
+def run_local(num_shards, difficulties, results_path=RESULTS_PATH, script="run_eval.py", python=sys.executable):
+    """Run every shard as a local run_eval.py process, wait for all of them, and merge their logs."""
+    procs = []
+    for k in range(num_shards):
+        cmd = [python, script, "--shard", f"{k}/{num_shards}", "--difficulties", ",".join(difficulties),
+               "--results", results_path]
+        procs.append(subprocess.Popen(cmd))
+    failed = [k for k, proc in enumerate(procs) if proc.wait() != 0]
+    if failed:
+        raise SystemExit(f"shards {failed} failed; rerun them (finished positions are kept) and merge again")
+    shards = [(k, num_shards) for k in range(num_shards)]
+    return merge_shards(shards, results_path)
+
+
+def merge_shards(shards, results_path=RESULTS_PATH):
+    records = merge_results([shard_path(results_path, shard) for shard in shards], results_path)
+    caches = [shard_path(RESPONSE_CACHE_PATH, shard) for shard in shards]
+    merge_response_caches([path for path in caches if os.path.exists(path)])
+    return records
+
+
+def _order(key):
+    difficulty, data_format, model, pos_id = key
+    return model, _rank(DIFFICULTIES, difficulty), _rank(FORMATS, data_format), pos_id
+
+
+def _rank(names, name):
+    return names.index(name) if name in names else len(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="run K local shard processes, then merge")
+    run.add_argument("--shards", type=int, required=True)
+    run.add_argument("--difficulties", default=",".join(DIFFICULTIES))
+    run.add_argument("--results", default=RESULTS_PATH)
+    run.add_argument("--script", default="run_eval.py", help="evaluation script to run for each shard")
+    merge = sub.add_parser("merge", help="merge shard results logs, e.g. copied back from other hosts")
+    merge.add_argument("paths", nargs="*", help="shard logs (default: <results>.shard-*.jsonl)")
+    merge.add_argument("--results", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        records = run_local(args.shards, args.difficulties.split(","), args.results, args.script)
+    else:
+        base, ext = os.path.splitext(args.results)
+        paths = args.paths or sorted(glob.glob(f"{base}.shard-*-of-*{ext}"))
+        records = merge_results(paths, args.results)
+        caches = sorted(glob.glob(shard_path(RESPONSE_CACHE_PATH, ("*", "*"))))
+        merge_response_caches(caches)
+    print(f"merged {len(records)} results into {args.results}")
+    print_final_averages(records)
+
+
+if __name__ == "__main__":
+    main()